@@ -0,0 +1,102 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from fleet import run_device, default_site, abort, DeviceResult, TIMEOUT
+from sinks import as_dict
+from session_pool import shared_pool
+
+"""
+Asyncio collection engine for the tshoot collectors
+
+Netmiko is blocking, so every device runs inside a thread executor driven by one event loop.
+An asyncio.Semaphore caps how many devices are open at the same time and the results come back
+as an async generator as soon as each device finishes, so a full inventory takes about as long
+as the slowest switch instead of the sum of all of them.
+
+The timeout of a device counts from the moment its thread starts it, not from the moment it is
+queued, and a device past it has its session transport closed (fleet.abort) so the thread is
+given back right away instead of holding an executor slot the next devices are waiting for.
+"""
+
+DEFAULT_CONCURRENCY = 256
+
+
+async def collect(devices, task, connection_params, concurrency=DEFAULT_CONCURRENCY, timeout=300, site_of=default_site, pool=None):
+    """
+    Async generator of fleet.DeviceResult, in the order the devices finish. Without a pool the sessions
+    come from the session broker daemon when it is running, or are new SSH sessions.
+    """
+    if pool is None:
+        pool = shared_pool(local=None)
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    # host -> start time and open session, filled by run_device on the executor threads
+    started = {}
+    sessions = {}
+
+    async def one_device(device):
+        host = str(device)
+        async with semaphore:
+            call = loop.run_in_executor(
+                executor,
+                partial(run_device, device, task, connection_params, site_of(device), started=started, pool=pool,
+                        sessions=sessions),
+            )
+            while True:
+                begin = started.get(host)
+                remaining = 1 if begin is None else timeout - (time.monotonic() - begin)
+                if remaining <= 0:
+                    break
+                done, _ = await asyncio.wait({call}, timeout=min(remaining, 1))
+                if done:
+                    return call.result()
+            # Forgotten here, so the thread does not record it when it finally returns
+            started.pop(host, None)
+            net_connect = sessions.get(host)
+            if net_connect is not None:
+                abort(net_connect)
+            return DeviceResult(host=host, site=site_of(device), status=TIMEOUT,
+                                error=f"no answer after {timeout}s", elapsed=time.monotonic() - begin)
+
+    tasks = [asyncio.ensure_future(one_device(device)) for device in devices]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for pending in tasks:
+            pending.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def run(devices, task, connection_params, callback, **kwargs):
+    """
+    Helper for the scripts without asyncio code, callback(result) is called as each device finishes
+    """
+    async def consume():
+        async for result in collect(devices, task, connection_params, **kwargs):
+            callback(result)
+
+    asyncio.run(consume())
+
+
+def stream(devices, task, connection_params, sink, on_failure=None, **kwargs):
+    """
+    task returns the records of one device, each one goes to sink.write() with the host added
+    as soon as the device finishes, nothing of the devices already written is kept in memory
+    """
+    async def consume():
+        written = 0
+        async for result in collect(devices, task, connection_params, **kwargs):
+            if result.status != "ok":
+                if on_failure is not None:
+                    on_failure(result)
+                continue
+            for record in result.data:
+                sink.write({"host": result.host, **as_dict(record)})
+                written += 1
+        return written
+
+    return asyncio.run(consume())
@@ -0,0 +1,266 @@
+import argparse
+import json
+import multiprocessing
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+from fleet import run_fleet
+import facts
+
+"""
+Benchmark of the hardening and tshoot pipelines against simulated switches
+
+SimulatedPool stands in for SSH (run_fleet pool=) with a configurable handshake latency,
+per command latency and number of interfaces per switch, so the real task functions of the
+scripts run without the lab. Each run goes on its own process and reports devices/sec, p50/p99
+per device and its peak RSS, and is appended to bench_results.jsonl to compare with the runs before a change.
+
+    python bench.py --devices 2000 --interfaces 48 --workers 8 32 128
+    python bench.py --compare
+"""
+
+RESULTS_FILE = "bench_results.jsonl"
+ERRDISABLED_RATIO = 0.05
+
+
+class SimulatedSwitch:
+    """
+    Generates the outputs of an IOS or NX-OS access switch with "interfaces" ports
+    """
+    def __init__(self, host, platform, interfaces, unused_ratio, command_latency, config_latency,
+                 hardened_ratio=0.0):
+        self.host = host
+        self.platform = platform
+        self.command_latency = command_latency
+        self.config_latency = config_latency
+        rng = random.Random(host)
+        prefix = "Eth1/" if platform == "NX-OS" else "Gi1/0/"
+        self.ports = [f"{prefix}{port}" for port in range(1, interfaces + 1)]
+        self.unused = {port for port in self.ports if rng.random() < unused_ratio}
+        # Unused ports a previous run already hardened
+        self.hardened = {port for port in self.unused if rng.random() < hardened_ratio}
+        # Ports in use the switch shut on a violation (IOS only, NX-OS recovers the xcvrAbsent ones)
+        self.errdisabled = set() if platform == "NX-OS" else {
+            port for port in self.ports if port not in self.unused and rng.random() < ERRDISABLED_RATIO
+        }
+        self.outputs = self._outputs()
+
+    def _outputs(self):
+        if self.platform == "NX-OS":
+            version = f"Cisco Nexus Operating System (NX-OS) Software\n  NXOS: version 9.3(8)\n  Device name: {self.host}\n"
+            long_name, short = "Ethernet", "Eth"
+            unused_status = "xcvrAbsen"
+        else:
+            version = f"Cisco IOS Software, Version 15.2(7)E3, RELEASE SOFTWARE\n{self.host} uptime is 3 weeks\n"
+            long_name, short = "GigabitEthernet", "Gi"
+            unused_status = "disabled"
+
+        running = []
+        for port in self.ports:
+            running.append(f"interface {long_name}{port[len(short):]}")
+            if port in self.hardened:
+                running += ["  description LIVRE", "  shutdown"]
+            running.append("!")
+
+        status = ["Port      Name               Status       Vlan       Duplex  Speed Type"]
+        unused = []
+        errdisabled = []
+        for port in self.ports:
+            state = unused_status if port in self.unused else "err-disabled" if port in self.errdisabled else "connected"
+            status.append(f"{port:<10}{'LIVRE':<19}{state:<13}1          auto    auto  10/100/1000BaseTX")
+            if port in self.unused:
+                unused.append(status[-1])
+            elif port in self.errdisabled:
+                errdisabled.append(status[-1])
+
+        vlans = ["VLAN Name                             Status    Ports",
+                 "---- -------------------------------- --------- -------------------------------"]
+        vlans += [f"{vlan:<5}VLAN{vlan:<28} active    " for vlan in range(1, 101)]
+        return {
+            "show version": version,
+            f"show interface status | in {unused_status}": "\n".join(unused),
+            "show interface status | in err-disable": "\n".join(errdisabled),
+            "show interface status": "\n".join(status),
+            "show running-config | section ^interface": "\n".join(running),
+            "show running-config interface": "\n".join(running),
+            "show vlan": "\n".join(vlans),
+        }
+
+    def send_command(self, command, **kwargs):
+        time.sleep(self.command_latency)
+        return self.outputs.get(command, "")
+
+    def send_config_set(self, config_commands, **kwargs):
+        time.sleep(self.config_latency)
+        return "\n".join(config_commands)
+
+    def find_prompt(self):
+        return f"{self.host}#"
+
+    def is_alive(self):
+        return True
+
+    def disconnect(self):
+        pass
+
+
+class SimulatedPool:
+    def __init__(self, interfaces=48, unused_ratio=0.3, connect_latency=1.0, command_latency=0.05,
+                 config_latency=0.5, nxos_ratio=0.5, hardened_ratio=0.5):
+        self.interfaces = interfaces
+        self.unused_ratio = unused_ratio
+        self.connect_latency = connect_latency
+        self.command_latency = command_latency
+        self.config_latency = config_latency
+        self.nxos_ratio = nxos_ratio
+        self.hardened_ratio = hardened_ratio
+
+    @contextmanager
+    def session(self, params):
+        host = params["host"]
+        platform = "NX-OS" if random.Random(host).random() < self.nxos_ratio else "IOS"
+        # SSH handshake
+        time.sleep(self.connect_latency)
+        yield SimulatedSwitch(host, platform, self.interfaces, self.unused_ratio,
+                              self.command_latency, self.config_latency, self.hardened_ratio)
+
+
+def simulated_params(host):
+    return {"host": host, "device_type": "cisco_ios"}
+
+
+def pipelines():
+    """
+    Task functions of the entry points, imported here so bench.py --compare does not need them
+    """
+    import parsers
+    import switch_hardening
+    import get_err_disbled_intface
+
+    def tshoot_vlans(net_connect, device):
+        return parsers.parse("IOS", "show vlan", net_connect.send_command("show vlan"))
+
+    return {
+        "hardening": switch_hardening.harden,
+        "errdisable": get_err_disbled_intface.recover,
+        "tshoot-vlans": tshoot_vlans,
+    }
+
+
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux gives KB, macOS gives bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def run_benchmark(name, task, devices, workers, pool):
+    hosts = [f"sim-{index:05d}" for index in range(devices)]
+    # Every run starts with a cold facts cache (it is never saved from here)
+    facts.cache.entries.clear()
+    summary = run_fleet(hosts, task, simulated_params, max_workers=workers, per_site=workers, pool=pool)
+    latencies = [result.elapsed for result in summary.results]
+    return {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "pipeline": name,
+        "devices": devices,
+        "workers": workers,
+        "interfaces": pool.interfaces,
+        "connect_latency": pool.connect_latency,
+        "command_latency": pool.command_latency,
+        "failed": len(summary.failed),
+        "elapsed": round(summary.elapsed, 3),
+        "devices_per_sec": round(devices / summary.elapsed, 2) if summary.elapsed else 0.0,
+        "p50": round(statistics.median(latencies), 4) if latencies else 0.0,
+        "p99": round(percentile(latencies, 99), 4),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def _run_pipeline(name, devices, workers, pool):
+    return run_benchmark(name, pipelines()[name], devices, workers, pool)
+
+
+def run_isolated(name, devices, workers, pool):
+    """
+    run_benchmark on a new process: ru_maxrss is the peak of the whole process and never goes down,
+    in one process every run after the biggest one would report its peak
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(_run_pipeline, name, devices, workers, pool).result()
+
+
+def save_result(result, filename=RESULTS_FILE):
+    with open(filename, "a") as f:
+        f.write(json.dumps(result) + "\n")
+
+
+def compare(filename=RESULTS_FILE):
+    """
+    Last two runs of each (pipeline, devices, workers) side by side
+    """
+    runs = {}
+    with open(filename, "r") as f:
+        for line in f:
+            result = json.loads(line)
+            runs.setdefault((result["pipeline"], result["devices"], result["workers"]), []).append(result)
+
+    print(f"{'pipeline':<14}{'devices':>8}{'workers':>8}{'before':>12}{'after':>12}{'change':>9}")
+    for (pipeline, devices, workers), results in sorted(runs.items()):
+        after = results[-1]["devices_per_sec"]
+        before = results[-2]["devices_per_sec"] if len(results) > 1 else after
+        change = (after - before) / before * 100 if before else 0.0
+        print(f"{pipeline:<14}{devices:>8}{workers:>8}{before:>12}{after:>12}{change:>8.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hardening and tshoot pipelines")
+    parser.add_argument("--pipeline", nargs="*", help="pipelines to run, all by default")
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--interfaces", type=int, default=48)
+    parser.add_argument("--workers", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--connect-latency", type=float, default=1.0)
+    parser.add_argument("--command-latency", type=float, default=0.05)
+    parser.add_argument("--config-latency", type=float, default=0.5)
+    parser.add_argument("--compare", action="store_true", help="only compare the saved results")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare()
+        return
+
+    pool = SimulatedPool(args.interfaces, connect_latency=args.connect_latency,
+                         command_latency=args.command_latency, config_latency=args.config_latency)
+    available = pipelines()
+    for name in args.pipeline or available:
+        for workers in args.workers:
+            result = run_isolated(name, args.devices, workers, pool)
+            save_result(result)
+            print(f"{name:<14} workers={workers:<4} {result['devices_per_sec']:>8} dev/s  "
+                  f"p50={result['p50']}s p99={result['p99']}s rss={result['peak_rss_mb']}MB failed={result['failed']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+from array import array
+from collections import namedtuple
+import json
+import os
+import struct
+import time
+
+"""
+Time series of the spanning-tree BPDU counters of the fleet
+
+Every collection appends one sample per (host, port, vlan) to column arrays: series id, time,
+received counter and edge flag. A raw counter says nothing alone, the analysis compares the
+last two samples of every series in one pass over the columns and gives the BPDUs received in
+between and the rate per minute. Edge (portfast) ports receiving BPDUs are flagged for the whole
+fleet at once. Only the series sampled by the latest collection (the samples added since the history
+was loaded) are compared, a port gone or a device that did not answer is not reported from old samples.
+
+numpy is not on requirements.txt, so the columns are stdlib arrays: compact (21 bytes per
+sample) and the scan over two collections of 100k port/vlan rows takes about 0.1s.
+"""
+
+HISTORY_FILE = "bpdu_history.bin"
+# Samples older than this are dropped when the history is saved
+RETENTION = 7 * 24 * 60 * 60
+
+BpduDelta = namedtuple("BpduDelta", ["host", "port", "vlan", "edge", "received", "delta", "seconds", "per_minute"])
+
+# Column name -> array typecode
+COLUMNS = (("series", "I"), ("time", "d"), ("received", "Q"), ("edge", "b"))
+
+
+class BpduHistory:
+    def __init__(self):
+        self.keys = []
+        self.index = {}
+        self.columns = {name: array(typecode) for name, typecode in COLUMNS}
+        # Series of the latest collection
+        self.collected = set()
+
+    def __len__(self):
+        return len(self.columns["time"])
+
+    def series_id(self, host, port, vlan):
+        key = (host, port, vlan)
+        series = self.index.get(key)
+        if series is None:
+            series = self.index[key] = len(self.keys)
+            self.keys.append(key)
+        return series
+
+    def add(self, host, records, timestamp=None):
+        """
+        One sample per parsers.Bpdu record of a device
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        columns = self.columns
+        for record in records:
+            series = self.series_id(host, record.port, record.vlan)
+            self.collected.add(series)
+            columns["series"].append(series)
+            columns["time"].append(timestamp)
+            columns["received"].append(record.received)
+            columns["edge"].append(1 if record.edge else 0)
+
+    def last_two(self):
+        """
+        {series: (previous row, last row)} of the series of the latest collection, in one pass over the
+        series column
+        """
+        last = {}
+        previous = {}
+        for row, series in enumerate(self.columns["series"]):
+            if series in last:
+                previous[series] = last[series]
+            last[series] = row
+        return {series: (row, last[series]) for series, row in previous.items() if series in self.collected}
+
+    def deltas(self, edge_only=False, min_delta=0):
+        """
+        BpduDelta of every series of the latest collection with two samples or more, from its last two samples.
+        A counter lower than before was cleared, the new value is the delta.
+        """
+        times, received, edge = self.columns["time"], self.columns["received"], self.columns["edge"]
+        results = []
+        for series, (row, current) in self.last_two().items():
+            if edge_only and not edge[current]:
+                continue
+            delta = received[current] - received[row]
+            if delta < 0:
+                delta = received[current]
+            if delta < min_delta:
+                continue
+            seconds = times[current] - times[row]
+            host, port, vlan = self.keys[series]
+            results.append(BpduDelta(
+                host, port, vlan, bool(edge[current]), received[current], delta, seconds,
+                delta * 60 / seconds if seconds > 0 else 0.0,
+            ))
+        return results
+
+    def edge_leaks(self, min_delta=1):
+        """
+        Edge ports that received BPDUs between the last two collections, busiest first
+        """
+        leaks = self.deltas(edge_only=True, min_delta=min_delta)
+        return sorted(leaks, key=lambda delta: delta.per_minute, reverse=True)
+
+    def prune(self, retention=RETENTION, now=None):
+        cutoff = (time.time() if now is None else now) - retention
+        times = self.columns["time"]
+        keep = [row for row, timestamp in enumerate(times) if timestamp >= cutoff]
+        if len(keep) == len(times):
+            return
+        self.columns = {
+            name: array(typecode, (self.columns[name][row] for row in keep)) for name, typecode in COLUMNS
+        }
+
+    def save(self, filename=HISTORY_FILE):
+        """
+        JSON header (series keys and sizes) followed by the raw columns
+        """
+        self.prune()
+        header = json.dumps({
+            "keys": self.keys,
+            "rows": len(self),
+            "itemsize": {name: self.columns[name].itemsize for name, _ in COLUMNS},
+        }).encode()
+        tmp = filename + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            for name, _ in COLUMNS:
+                self.columns[name].tofile(f)
+        os.replace(tmp, filename)
+
+    @classmethod
+    def load(cls, filename=HISTORY_FILE):
+        history = cls()
+        if not os.path.exists(filename):
+            return history
+        with open(filename, "rb") as f:
+            (size,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(size))
+            for name, typecode in COLUMNS:
+                if header["itemsize"][name] != history.columns[name].itemsize:
+                    raise ValueError(f"{filename} was written on another architecture")
+                history.columns[name].fromfile(f, header["rows"])
+        history.keys = [tuple(key) for key in header["keys"]]
+        history.index = {key: series for series, key in enumerate(history.keys)}
+        return history
@@ -0,0 +1,80 @@
+import re
+from interfaces import short_name
+
+"""
+Desired state of the interfaces, so the hardening only pushes what is missing
+
+The interface part of the running-config is read once per device and indexed by interface.
+Each candidate interface is compared with the policy and only the commands that are not there
+yet are planned. Interfaces already hardened cost nothing and a device without changes gets
+no config session at all.
+"""
+
+# What an unused interface must look like after the hardening
+HARDENING_POLICY = {"description": "LIVRE", "shutdown": True}
+
+# Only the interface stanzas of the running-config
+RUNNING_CONFIG_COMMANDS = {
+    "IOS": "show running-config | section ^interface",
+    "NX-OS": "show running-config interface",
+}
+
+interface_line = re.compile(r"^interface (.+?)\s*$")
+
+
+def index_interfaces(running_config):
+    """
+    {short interface name: [config lines without indentation]}
+    """
+    interfaces = {}
+    current = None
+    for line in running_config.splitlines():
+        match = interface_line.match(line)
+        if match:
+            current = interfaces.setdefault(short_name(match.group(1)), [])
+        elif line.startswith(" ") and current is not None:
+            current.append(line.strip())
+        else:
+            current = None
+    return interfaces
+
+
+def interface_state(lines):
+    state = {"description": None, "shutdown": False}
+    for line in lines:
+        if line.startswith("description "):
+            state["description"] = line[len("description "):]
+        elif line == "shutdown":
+            state["shutdown"] = True
+        elif line == "no shutdown":
+            state["shutdown"] = False
+    return state
+
+
+def delta(state, policy):
+    commands = []
+    if "description" in policy and state["description"] != policy["description"]:
+        commands.append(f"description {policy['description']}")
+    if "shutdown" in policy and state["shutdown"] != policy["shutdown"]:
+        commands.append("shutdown" if policy["shutdown"] else "no shutdown")
+    return commands
+
+
+def plan(running_config, interfaces, policy=HARDENING_POLICY):
+    """
+    {(commands...): [interfaces]} with only the interfaces that need a change
+    """
+    index = index_interfaces(running_config)
+    changes = {}
+    for interface in interfaces:
+        commands = delta(interface_state(index.get(short_name(interface), [])), policy)
+        if commands:
+            changes.setdefault(tuple(commands), []).append(interface)
+    return changes
+
+
+def plan_device(net_connect, platform, interfaces, policy=HARDENING_POLICY):
+    if not interfaces:
+        return {}
+    command = RUNNING_CONFIG_COMMANDS.get(platform, "show running-config")
+    return plan(net_connect.send_command(command), interfaces, policy)
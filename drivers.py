@@ -0,0 +1,233 @@
+import json
+import re
+import net_conn
+import facts
+import parsers
+import mac_table
+from mac_table import MacEntry
+from interfaces import short_name, parse_status, InterfaceStatus
+from parsers import Vlan
+from remediation import RANGES_PER_LINE
+from fleet import UnsupportedPlatform
+
+"""
+One driver per platform (IOS, NX-OS, DellOS9) for the collectors
+
+A driver knows the commands of its platform, how to parse them and what the platform can do
+(structured "| json" output, interface ranges). The collectors ask the driver for typed records
+(facts, Vlan, MacEntry, InterfaceStatus, Bpdu) instead of sending commands themselves, so a
+faster way to get something lands here once for every tool.
+
+    driver = drivers.get("NX-OS")
+    run(inventory.hosts(), lambda net_connect, host: driver.vlans(net_connect), driver.params, callback)
+"""
+
+# Counters and the edge (portfast) flag of every port/vlan
+BPDU_COMMAND = "show spanning-tree detail | inc Eth|BPDU|portfast|edge"
+
+
+class Driver:
+    platform = None
+    # Capabilities
+    json_output = False
+    ranges_per_line = None
+    bpdu_counters = True
+
+    commands = {
+        "version": "show version",
+        "clock": "show clock",
+        "vlans": "show vlan",
+        "interface_status": "show interface status",
+        "bpdu": BPDU_COMMAND,
+    }
+
+    uptime_pattern = re.compile(r"uptime is (.+)")
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.platform}>"
+
+    @property
+    def device_type(self):
+        return facts.DEVICE_TYPES[self.platform]
+
+    def params(self, host):
+        """
+        Netmiko dict of a lab device of this platform
+        """
+        return {
+            "device_type": self.device_type,
+            "host": host,
+            "username": net_conn.user_lab,
+            "password": net_conn.pass_lab,
+            "secret": net_conn.pass_lab,
+        }
+
+    def send(self, net_connect, name):
+        return net_connect.send_command(self.commands[name])
+
+    def device_info(self, net_connect, clock=True):
+        """
+        {"hostname", "model", "version", "uptime", "clock"}, clock is None when not asked: "show clock"
+        is never cached, asking it would connect to a device the cache already answered
+        """
+        output = self.send(net_connect, "version")
+        info = facts.parse_show_version(output)
+        match = self.uptime_pattern.search(output)
+        return {
+            "hostname": info["hostname"],
+            "model": info["model"],
+            "version": info["version"],
+            "uptime": match.group(1).strip() if match else None,
+            "clock": self.send(net_connect, "clock").strip() if clock else None,
+        }
+
+    def hostname(self, net_connect):
+        return facts.parse_show_version(self.send(net_connect, "version"))["hostname"]
+
+    def vlans(self, net_connect):
+        return parsers.parse(self.platform, self.commands["vlans"], self.send(net_connect, "vlans"))
+
+    def mac_table(self, net_connect, vlans=None):
+        """
+        [MacEntry], only the VLANs asked when vlans is given
+        """
+        output = net_connect.send_command(mac_table.MAC_TABLE_COMMANDS[self.platform])
+        return list(mac_table.parse_mac_table(output, self.platform, vlans))
+
+    def interface_status(self, net_connect):
+        return parse_status(self.send(net_connect, "interface_status"), self.platform)
+
+    def bpdu(self, net_connect):
+        if not self.bpdu_counters:
+            raise UnsupportedPlatform(f"no BPDU counters parser for {self.platform}")
+        return parsers.parse(self.platform, self.commands["bpdu"], self.send(net_connect, "bpdu"))
+
+
+class IosDriver(Driver):
+    platform = "IOS"
+    ranges_per_line = RANGES_PER_LINE["IOS"]
+
+
+def json_rows(data, table):
+    """
+    Rows of TABLE_x/ROW_x on NX-OS json, a single row comes as a dict instead of a list
+    """
+    rows = data.get(f"TABLE_{table}", {}).get(f"ROW_{table}", [])
+    return rows if isinstance(rows, list) else [rows]
+
+
+class NxosDriver(Driver):
+    platform = "NX-OS"
+    json_output = True
+    ranges_per_line = RANGES_PER_LINE["NX-OS"]
+
+    uptime_pattern = re.compile(r"Kernel uptime is (.+)")
+
+    def send_json(self, net_connect, command):
+        """
+        Structured output of "command | json", None on old releases without it (text parsers are used)
+        """
+        if not self.json_output:
+            return None
+        output = net_connect.send_command(f"{command} | json")
+        try:
+            return json.loads(output)
+        except ValueError:
+            return None
+
+    def device_info(self, net_connect, clock=True):
+        data = self.send_json(net_connect, "show version")
+        if data is None:
+            return super().device_info(net_connect, clock)
+        uptime = ", ".join(
+            f"{data[key]} {unit}" for key, unit in
+            (("kern_uptm_days", "days"), ("kern_uptm_hrs", "hours"), ("kern_uptm_mins", "minutes"),
+             ("kern_uptm_secs", "seconds"))
+            if key in data
+        )
+        return {
+            "hostname": data.get("host_name"),
+            "model": (data.get("chassis_id") or "").replace(" chassis", "") or None,
+            "version": data.get("nxos_ver_str") or data.get("kickstart_ver_str"),
+            "uptime": uptime or None,
+            "clock": self.send(net_connect, "clock").strip() if clock else None,
+        }
+
+    def hostname(self, net_connect):
+        data = self.send_json(net_connect, "show hostname")
+        if data is None:
+            return super().hostname(net_connect)
+        return data.get("hostname")
+
+    def vlans(self, net_connect):
+        data = self.send_json(net_connect, "show vlan brief")
+        if data is None:
+            return super().vlans(net_connect)
+        vlans = []
+        for row in json_rows(data, "vlanbriefxbrief"):
+            ports = row.get("vlanshowplist-ifidx") or []
+            if isinstance(ports, str):
+                ports = ports.split(",")
+            vlans.append(Vlan(
+                int(row["vlanshowbr-vlanid"]),
+                row.get("vlanshowbr-vlanname"),
+                row.get("vlanshowbr-vlanstate"),
+                tuple(short_name(port) for port in ports if port.strip()),
+            ))
+        return vlans
+
+    def mac_table(self, net_connect, vlans=None):
+        data = self.send_json(net_connect, mac_table.MAC_TABLE_COMMANDS[self.platform])
+        if data is None:
+            return super().mac_table(net_connect, vlans)
+        wanted = set(vlans) if vlans is not None else None
+        entries = []
+        for row in json_rows(data, "mac_address"):
+            vlan = row.get("disp_vlan", "")
+            if not vlan.isdigit() or (wanted is not None and int(vlan) not in wanted):
+                continue
+            entries.append(MacEntry(
+                int(vlan),
+                row["disp_mac_addr"].lower(),
+                short_name(row.get("disp_port", "")),
+                "static" if row.get("disp_is_static") == "enabled" else "dynamic",
+            ))
+        return entries
+
+    def interface_status(self, net_connect):
+        data = self.send_json(net_connect, self.commands["interface_status"])
+        if data is None:
+            return super().interface_status(net_connect)
+        ports = {}
+        for row in json_rows(data, "interface"):
+            port = short_name(row["interface"])
+            ports[port] = InterfaceStatus(
+                port, row.get("name", ""), row.get("state", ""), str(row.get("vlan", "")),
+                row.get("duplex", ""), row.get("speed", ""), row.get("type", ""),
+            )
+        return ports
+
+
+class DellOS9Driver(Driver):
+    platform = "DellOS9"
+    # "show spanning-tree" on FTOS has nothing like the per port/vlan detail lines of Cisco
+    bpdu_counters = False
+
+    commands = {**Driver.commands, "interface_status": "show interfaces status"}
+
+
+DRIVERS = {driver.platform: driver for driver in (IosDriver(), NxosDriver(), DellOS9Driver())}
+
+
+def get(platform):
+    try:
+        return DRIVERS[platform]
+    except KeyError:
+        raise ValueError(f"No driver for {platform}, use one of {', '.join(DRIVERS)}") from None
+
+
+def for_device(net_connect, host):
+    """
+    Driver of a device already connected, the platform comes from the facts cache or "show version"
+    """
+    return get(facts.device_facts(net_connect, host)["platform"] or "IOS")
@@ -1,54 +1,76 @@
-from netmiko import ConnectHandler
-import re
+import argparse
 import net_conn
-import auth
+import inventory
 import logging
+from log_setup import setup_logging
+from fleet import run_fleet
+from remediation import remediate
+from interfaces import with_status
+import facts
+import metrics
+import timing
+import replay
 
 # To show logging and troubleshooting in case of problems
-logging.basicConfig(filename='netmiko_global.log', level=logging.DEBUG)
+setup_logging(transcripts="transcripts")
 logger = logging.getLogger("netmiko")
 
 """
-The main proposal here is to identify all interfaces on environment without that not using 
+The main proposal here is to identify all interfaces on environment without that not using
 and disable to avoid man-in-the-middle.
 
-I'm using Netbox as Source of Truth to connect in devices. Function net_conn imported to use Netmiko 
-and function auth to pass all the parameters to authenticate 
+I'm using Netbox as Source of Truth to connect in devices. Function net_conn imported to use Netmiko
+and function auth to pass all the parameters to authenticate
 """
 
-#nb_api = list(auth.nb.dcim.devices.filter("mgmt",model="9200"))
-nb_api = list(auth.nb.dcim.devices.filter(platform="cisco-ios"))
-#nb_api = list(auth.nb.dcim.devices.filter(platform="cisco-nx-os"))
-#nb_api = list(auth.nb.dcim.devices.filter(platform="dellos"))
-print(f'All devices will be check:\n{nb_api}\n')
 
-# Regex pattern to find all kinds of interface like FastEthernet, GigabitEthernet, Ethernet, TenGigabiEthernet and so on..
-int_pattern = re.compile(r"(?P<interface>\S+[A-Za-z][0-9].[0-9].[0-9]*)")
+def recover_errdisabled(net_connect, device):
+    output = net_connect.send_command('show interface status | in err-disable')
+    all_int = with_status(output, "IOS", "err-disabled")
+    if not all_int:
+        return {}
+
+    #Turn on err-disabled interfaces, all of them in one config block
+    cmd, status = remediate(net_connect, "IOS", all_int, ['shutdown', 'no shutdown'])
+    logger.debug(cmd)
+    return status
+
 
 """
 Loop devices find on Netbox
 """
-def errdisabled():
-    for ip in nb_api:
-        ipadd = str(ip)
-        ios = net_conn.netmiko_lab(ipadd)
-        print(f"Connecting to {ipadd}")
-        net_connect = ConnectHandler(**ios)
-        output = net_connect.send_command('show interface status | in err-disable')
-        match = int_pattern.search(output)
-        try:
-            interface = match.group("interface")
-            all_int = re.findall(int_pattern, output)
-        except (AttributeError):
-            print('No such attribute')
-            continue
-        #if "err-disable" in output:
-        if "err-disable" in output:
-            print(f'\nInterfaces in err-disable status:\n{all_int}\n')
-    
-        for i in all_int:
-            #Turn on err-disabled interfaces
-            cmd = net_connect.send_config_set([f'interface {i}', 'shutdown', 'no shutdown'])
-            print(cmd)
-errdisabled()
+def errdisabled(pool=None, platform="cisco-ios", **filters):
+    metrics.enable_console()
+
+    # Devices from the local Netbox inventory cache, the API is only called to refresh it
+    # platform: cisco-ios, cisco-nx-os or dellos - model="9200", site=... and role=... also work
+    with metrics.span("netbox"):
+        nb_api = inventory.hosts(platform=platform, **filters)
+    print(f'All devices will be check:\n{[str(device) for device in nb_api]}\n')
+
+    # Netbox already knows the platform, keep it on the facts cache for the other scripts
+    facts.load_netbox(nb_api)
+
+    summary = run_fleet(nb_api, recover_errdisabled, net_conn.netmiko_lab, pool=pool)
+    # Facts and timings learned from replayed or simulated sessions are not the real devices
+    if pool is None:
+        facts.cache.save()
+        timing.profile.save()
+    for result in summary.ok:
+        if result.data:
+            print(f'\n{result.host} - Interfaces in err-disable status:\n{result.data}\n')
+    summary.print_report()
+    metrics.write_openmetrics()
+    return summary
+
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bring back err-disabled interfaces")
+    replay.add_arguments(parser)
+    inventory.add_arguments(parser)
+    parser.set_defaults(platform="cisco-ios")
+    args = parser.parse_args()
+    pool = replay.transport_pool(args)
+    errdisabled(pool, **{column: getattr(args, column) for column in inventory.FILTERS})
+    if pool is not None:
+        pool.preview()
@@ -0,0 +1,301 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict, deque
+from colorama import Fore
+from fleet import run_device, OK
+from log_setup import setup_logging
+from remediation import remediate
+from interfaces import with_status
+from session_pool import shared_pool
+from facts import device_facts, cached_device_type
+import argparse
+import heapq
+import inventory
+import logging
+import metrics
+import net_conn
+import timing
+import facts
+import re
+import socketserver
+import threading
+import time
+
+logger = logging.getLogger("errdisable")
+
+"""
+Errdisable recovery service, replaces the errdisable.py sweep on cron
+
+Switches send their syslog to a local UDP listener and a %PM-4-ERR_DISABLE message queues a
+recovery of that device a few seconds later. Devices are polled only as a backstop: the poll
+interval starts at POLL_MIN, doubles every time nothing is found up to POLL_MAX, and devices
+already sending syslog stay at POLL_MAX.
+
+Every device has at most one recovery running, events arriving meanwhile run it once more at the
+end. A port recovered MAX_RECOVERIES times inside FLAP_WINDOW is flapping and is left err-disabled
+until the window clears, then its device is queued again.
+
+Only devices of the inventory are recovered: syslog from any other address is dropped, a spoofed
+packet must not make the daemon log in somewhere with the lab credentials.
+
+    python errdisable_daemon.py --listen 0.0.0.0:5514 --poll --site br-lp
+"""
+
+SYSLOG_ADDRESS = ("0.0.0.0", 5514)
+# Seconds between the syslog message and the recovery, so the cause has a chance to clear
+RECOVERY_DELAY = 30
+POLL_MIN = 60
+POLL_MAX = 60 * 60
+FLAP_WINDOW = 60 * 60
+MAX_RECOVERIES = 3
+WORKERS = 16
+
+ERR_DISABLE_PATTERNS = [
+    # IOS: %PM-4-ERR_DISABLE: bpduguard error detected on Gi1/0/5, putting Gi1/0/5 in err-disable state
+    re.compile(r"%PM-4-ERR_DISABLE:\s*(?P<reason>\S+) error detected on (?P<interface>[^,\s]+)"),
+    # NX-OS: %ETHPORT-5-IF_DOWN_ERROR_DISABLED: Interface Ethernet1/5 is down (Error disabled. Reason:BPDUGuard)
+    re.compile(r"%ETHPORT-5-IF_DOWN_ERROR_DISABLED: Interface (?P<interface>\S+) is down "
+               r"\(Error disabled\. Reason:\s*(?P<reason>[^)]+)\)"),
+]
+
+
+def parse_syslog(message):
+    """
+    (interface, reason) of an err-disable message, None for anything else
+    """
+    for pattern in ERR_DISABLE_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            return match.group("interface"), match.group("reason")
+    return None
+
+
+class SyslogHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        data = self.request[0]
+        self.server.service.on_syslog(self.client_address[0], data.decode(errors="replace"))
+
+
+class RecoveryService:
+    def __init__(self, connection_params, devices=(), pool=None, workers=WORKERS, delay=RECOVERY_DELAY,
+                 flap_window=FLAP_WINDOW, max_recoveries=MAX_RECOVERIES):
+        self.connection_params = connection_params
+        self.pool = pool
+        self.delay = delay
+        self.flap_window = flap_window
+        self.max_recoveries = max_recoveries
+        # Syslog comes from the management address, the connection uses the device name
+        self.names = {device.primary_ip: str(device) for device in devices if getattr(device, "primary_ip", None)}
+        # Hosts file entries are already the addresses
+        self.names.update({str(device): str(device) for device in devices})
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        self.active = set()
+        self.again = set()
+        self.scheduled = set()
+        self.syslog_hosts = set()
+        self.recoveries = defaultdict(deque)
+        self.held = set()
+        self.intervals = {}
+        self.next_poll = {}
+        self.poll_queue = []
+        self.wakeup = threading.Condition(self.lock)
+        self.stopped = threading.Event()
+        self.server = None
+
+    # Events
+
+    def on_syslog(self, address, message):
+        event = parse_syslog(message)
+        if event is None:
+            return
+        interface, reason = event
+        host = self.names.get(address)
+        if host is None:
+            metrics.inc("errdisable_unknown_senders")
+            logger.warning("err-disable message from %s dropped, not an inventory device", address)
+            return
+        metrics.inc("errdisable_events", reason=reason)
+        logger.info("%s err-disabled by %s", interface, reason, extra={"host": host})
+        with self.lock:
+            self.syslog_hosts.add(host)
+            if host in self.scheduled:
+                return
+            self.scheduled.add(host)
+        timer = threading.Timer(self.delay, self.submit, (host,))
+        timer.daemon = True
+        timer.start()
+
+    def submit(self, host):
+        """
+        Queue a recovery, a device already being recovered runs once more when it is done
+        """
+        with self.lock:
+            self.scheduled.discard(host)
+            if host in self.active:
+                self.again.add(host)
+                return
+            self.active.add(host)
+        self.executor.submit(self._run, host)
+
+    def _run(self, host):
+        while True:
+            result = run_device(host, self.recover, self.connection_params, pool=self.pool)
+            found = result.data if result.status == OK else None
+            with self.lock:
+                self._reschedule(host, found)
+                if host not in self.again:
+                    self.active.discard(host)
+                    return
+                self.again.discard(host)
+
+    # Recovery
+
+    def allowed(self, host, interface, now=None):
+        """
+        False once the port was recovered max_recoveries times inside flap_window, the device is
+        queued again when the oldest of those recoveries leaves the window. Called with the lock held.
+        """
+        now = time.monotonic() if now is None else now
+        history = self.recoveries[(host, interface)]
+        while history and now - history[0] > self.flap_window:
+            history.popleft()
+        if len(history) >= self.max_recoveries:
+            if (host, interface) not in self.held:
+                self.held.add((host, interface))
+                metrics.inc("errdisable_flapping")
+                logger.warning("%s is flapping, left err-disabled", interface, extra={"host": host})
+                timer = threading.Timer(history[0] + self.flap_window - now + 1, self.submit, (host,))
+                timer.daemon = True
+                timer.start()
+            return False
+        self.held.discard((host, interface))
+        history.append(now)
+        return True
+
+    def recover(self, net_connect, device):
+        """
+        Task for run_device: bounce every err-disabled port that is not flapping, return the ports found
+        """
+        host = str(device)
+        platform = device_facts(net_connect, host)["platform"] or "IOS"
+        output = net_connect.send_command("show interface status | in err-disable")
+        found = with_status(output, platform, "err-disabled")
+        with self.lock:
+            ports = [port for port in found if self.allowed(host, port)]
+        if ports:
+            config, status = remediate(net_connect, platform, ports, ["shutdown", "no shutdown"])
+            logger.debug(config, extra={"host": host})
+            metrics.inc("errdisable_recovered", amount=len(ports))
+            logger.info("recovered %s", status, extra={"host": host})
+        return found
+
+    # Adaptive polling
+
+    def watch(self, devices):
+        with self.lock:
+            for device in devices:
+                self._reschedule(str(device), None, first=True)
+
+    def _reschedule(self, host, found, first=False):
+        """
+        Called with the lock held, only for polled devices
+        """
+        if not first and host not in self.intervals:
+            return
+        if first or found:
+            interval = POLL_MIN
+        else:
+            interval = min(POLL_MAX, self.intervals[host] * 2)
+        if host in self.syslog_hosts:
+            interval = POLL_MAX
+        self.intervals[host] = interval
+        due = time.monotonic() + (0 if first else interval)
+        self.next_poll[host] = due
+        heapq.heappush(self.poll_queue, (due, host))
+        self.wakeup.notify()
+
+    def poll_loop(self):
+        while not self.stopped.is_set():
+            due_hosts = []
+            with self.lock:
+                now = time.monotonic()
+                while self.poll_queue and self.poll_queue[0][0] <= now:
+                    due, host = heapq.heappop(self.poll_queue)
+                    # Entries replaced by a newer schedule are skipped
+                    if self.next_poll.get(host) == due:
+                        due_hosts.append(host)
+                if not due_hosts:
+                    timeout = self.poll_queue[0][0] - now if self.poll_queue else POLL_MAX
+                    self.wakeup.wait(timeout)
+                    continue
+            for host in due_hosts:
+                self.submit(host)
+            metrics.write_openmetrics()
+            timing.profile.save()
+
+    # Service
+
+    def serve(self, address=SYSLOG_ADDRESS, listen=True, poll=True):
+        threads = []
+        if poll:
+            threads.append(threading.Thread(target=self.poll_loop, daemon=True))
+        if listen:
+            self.server = socketserver.ThreadingUDPServer(address, SyslogHandler)
+            self.server.service = self
+            threads.append(threading.Thread(target=self.server.serve_forever, daemon=True))
+            logger.info("syslog listener on %s:%s", *address)
+        for thread in threads:
+            thread.start()
+        try:
+            self.stopped.wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        self.stopped.set()
+        with self.lock:
+            self.wakeup.notify_all()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        metrics.write_openmetrics()
+        timing.profile.save()
+
+
+def parse_address(value):
+    host, _, port = value.rpartition(":")
+    return host or SYSLOG_ADDRESS[0], int(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recover err-disabled interfaces from syslog events")
+    parser.add_argument("--listen", type=parse_address, default=SYSLOG_ADDRESS,
+                        help="Syslog UDP address, host:port (default 0.0.0.0:5514)")
+    parser.add_argument("--no-syslog", action="store_true", help="Only poll, no syslog listener")
+    parser.add_argument("--poll", action="store_true", help="Also poll the devices with adaptive intervals")
+    inventory.add_arguments(parser)
+    args = parser.parse_args()
+    if args.no_syslog and not args.poll:
+        parser.error("--no-syslog needs --poll")
+
+    setup_logging(transcripts="transcripts")
+    metrics.enable_console()
+
+    # Netbox devices from the inventory cache with --platform/--site/--model/--role, "hosts" file without
+    with metrics.span("netbox"):
+        devices = inventory.from_args(args)
+    facts.load_netbox(devices)
+
+    # Warm sessions of the session broker daemon when it is running
+    service = RecoveryService(cached_device_type(net_conn.netmiko_lab), devices, pool=shared_pool(local=None))
+    if args.poll:
+        service.watch(devices)
+    print(Fore.BLUE + f"Watching {len(devices)} devices" + Fore.RESET)
+    service.serve(args.listen, listen=not args.no_syslog, poll=args.poll)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import json
+import os
+import re
+import threading
+import time
+
+"""
+Device facts cache (platform, version, hostname and model) shared by the scripts
+
+Facts come from one "show version" per device, or from the Netbox platform field, and are kept
+in facts_cache.json keyed by host with a TTL. Next runs pick the platform and the netmiko
+device_type from the cache without sending "show version" again.
+"""
+
+CACHE_FILE = "facts_cache.json"
+CACHE_TTL = 24 * 60 * 60
+
+# Platform name used by the scripts -> netmiko device_type
+DEVICE_TYPES = {
+    "NX-OS": "cisco_nxos",
+    "IOS": "cisco_ios",
+    "DellOS9": "dell_force10",
+}
+
+# Netbox platform slug -> platform name
+NETBOX_PLATFORMS = {
+    "cisco-nx-os": "NX-OS",
+    "cisco-ios": "IOS",
+    "dellos": "DellOS9",
+}
+
+# netmiko autodetect result -> platform name
+AUTODETECT_PLATFORMS = {device_type: platform for platform, device_type in DEVICE_TYPES.items()}
+
+# Regex patterns per platform to read "show version" only once
+VERSION_PATTERNS = {
+    "NX-OS": {
+        "hostname": re.compile(r"Device name:\s*(\S+)"),
+        "version": re.compile(r"(?:NXOS|system):\s+version\s+(\S+)"),
+        "model": re.compile(r"cisco (Nexus\s?\S*\s\S+)"),
+    },
+    "IOS": {
+        "hostname": re.compile(r"^(\S+) uptime is", re.M),
+        "version": re.compile(r"Version ([^,\s]+)"),
+        "model": re.compile(r"(?:Model [Nn]umber\s*:\s*(\S+)|^[Cc]isco (\S+) .+processor)", re.M),
+    },
+    "DellOS9": {
+        "hostname": re.compile(r"^(\S+) uptime is", re.M),
+        "version": re.compile(r"Dell (?:Networking|Force10) OS Version:\s*(\S+)"),
+        "model": re.compile(r"System Type:\s*(\S+)"),
+    },
+}
+
+
+def detect_platform(show_version):
+    if "NX-OS" in show_version:
+        return "NX-OS"
+    if "Dell" in show_version or "Force10" in show_version:
+        return "DellOS9"
+    if "IOS" in show_version:
+        return "IOS"
+    return None
+
+
+def parse_show_version(show_version):
+    platform = detect_platform(show_version)
+    facts = {"platform": platform, "version": None, "hostname": None, "model": None}
+    for key, pattern in VERSION_PATTERNS.get(platform, {}).items():
+        match = pattern.search(show_version)
+        if match:
+            facts[key] = next((group for group in match.groups() if group), None)
+    return facts
+
+
+class FactsCache:
+    def __init__(self, filename=CACHE_FILE, ttl=CACHE_TTL):
+        self.filename = filename
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(filename):
+            with open(filename, "r") as f:
+                self.entries = json.load(f)
+
+    def get(self, host):
+        with self.lock:
+            entry = self.entries.get(host)
+        if entry is None or time.time() - entry["updated"] > self.ttl:
+            return None
+        return entry["facts"]
+
+    def put(self, host, facts):
+        with self.lock:
+            current = self.entries.get(host, {}).get("facts", {})
+            # Keep what we already know when the new source has less details (Netbox only has platform)
+            merged = {**current, **{key: value for key, value in facts.items() if value}}
+            self.entries[host] = {"updated": time.time(), "facts": merged}
+        return merged
+
+    def save(self):
+        with self.lock:
+            data = json.dumps(self.entries, indent=2)
+        tmp = self.filename + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(data)
+        os.replace(tmp, self.filename)
+
+
+# Shared by all the scripts running in the same process
+cache = FactsCache()
+
+
+def device_facts(net_connect, host, facts_cache=cache):
+    """
+    Facts from the cache or from one "show version" on the device
+    """
+    facts = facts_cache.get(host)
+    if facts and facts.get("platform"):
+        return facts
+    facts = parse_show_version(net_connect.send_command("show version"))
+    return facts_cache.put(host, facts)
+
+
+def load_netbox(devices, facts_cache=cache):
+    """
+    Fill the cache from Netbox devices already fetched, only platform (and model) are known there
+    """
+    for device in devices:
+        # pynetbox records have objects with a slug, the inventory cache has the slug itself
+        platform = getattr(device, "platform", None)
+        slug = getattr(platform, "slug", platform)
+        if slug not in NETBOX_PLATFORMS:
+            continue
+        model = getattr(device, "model", None) or getattr(getattr(device, "device_type", None), "model", None)
+        facts_cache.put(str(device), {
+            "platform": NETBOX_PLATFORMS[slug],
+            "model": model,
+        })
+
+
+def autodetect(params):
+    """
+    netmiko SSHDetect, only used when the cache does not know the device
+    """
+    from netmiko import SSHDetect
+
+    detected = SSHDetect(**{**params, "device_type": "autodetect"}).autodetect()
+    return AUTODETECT_PLATFORMS.get(detected)
+
+
+def cached_device_type(connection_params, facts_cache=cache, use_autodetect=False):
+    """
+    Wrap a net_conn helper so device_type comes from the cached platform
+    """
+    def params(host):
+        device = connection_params(host)
+        facts = facts_cache.get(host)
+        platform = facts.get("platform") if facts else None
+        if platform is None and use_autodetect:
+            platform = autodetect(device)
+            if platform:
+                facts_cache.put(host, {"platform": platform})
+        if platform in DEVICE_TYPES:
+            device["device_type"] = DEVICE_TYPES[platform]
+        return device
+
+    return params
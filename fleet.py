@@ -0,0 +1,298 @@
+from netmiko import ConnectHandler
+from netmiko.exceptions import NetmikoTimeoutException
+from netmiko.exceptions import AuthenticationException
+from netmiko.exceptions import SSHException
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from colorama import Fore
+from log_setup import with_transcript, keep_transcript
+from session_pool import shared_pool
+import metrics
+import timing
+# Registers the listener dropping cached outputs of a device after a config push
+import output_cache  # noqa: F401
+import logging
+import time
+
+logger = logging.getLogger("fleet")
+
+"""
+Shared fleet executor used by switch_hardening.py, get_err_disbled_intface.py and errdisable.py
+
+Each device runs on a pool of worker threads. The pool size is the global cap, and a site never
+has more than per_site devices submitted at the same time (the next one goes in as one finishes),
+so one big site can neither hammer its switches nor take all the workers from the other sites.
+Devices without a known site (the "hosts" file) are only capped by the workers.
+A device that takes longer than "timeout" seconds is marked as timeout, its session transport is
+closed so its thread fails on the next read instead of going on in the background, and the run
+moves on. Every device ends up as a DeviceResult inside a FleetSummary instead of prints on the screen.
+"""
+
+# Status used on DeviceResult
+OK = "ok"
+TIMEOUT = "timeout"
+AUTH_FAILURE = "auth_failure"
+EOF = "eof"
+SSH_ERROR = "ssh_error"
+UNSUPPORTED = "unsupported"
+ERROR = "error"
+
+# Site of the devices without one, not capped per site
+NO_SITE = "default"
+
+
+class UnsupportedPlatform(Exception):
+    """
+    Raised by a task for a platform it has no commands for, the device is skipped as "unsupported"
+    """
+
+
+@dataclass
+class DeviceResult:
+    host: str
+    site: str
+    status: str = OK
+    data: object = None
+    error: str = ""
+    elapsed: float = 0.0
+
+
+@dataclass
+class FleetSummary:
+    results: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def ok(self):
+        return [r for r in self.results if r.status == OK]
+
+    @property
+    def failed(self):
+        return [r for r in self.results if r.status != OK]
+
+    def counts(self):
+        return Counter(r.status for r in self.results)
+
+    def print_report(self):
+        """
+        Totals and slowest switches, each device was already printed by the metrics console listener
+        """
+        counts = self.counts()
+        print(
+            Fore.BLUE
+            + f"\n{len(self.results)} devices in {self.elapsed:.1f}s - "
+            + ", ".join(f"{status}: {total}" for status, total in sorted(counts.items()))
+            + Fore.RESET
+        )
+        slowest = sorted(self.results, key=lambda result: result.elapsed, reverse=True)[:5]
+        if slowest:
+            print("Slowest: " + ", ".join(f"{result.host} {result.elapsed:.1f}s" for result in slowest))
+
+
+def default_site(device):
+    """
+    Netbox devices carry the site, plain hostnames from the "hosts" file all go to the same bucket
+    """
+    site = getattr(device, "site", None)
+    if site is None:
+        return NO_SITE
+    return str(getattr(site, "slug", site))
+
+
+def read_hosts(filename="hosts"):
+    with open(filename, "r") as f:
+        return [line.strip() for line in f.read().splitlines() if line.strip()]
+
+
+@contextmanager
+def connect(params, pool=None):
+    """
+    Session from the pool (session_pool.SessionPool) when there is one, or a new one closed at the end.
+    The connection given back times every command on the metrics, with the read_timeout and delay
+    factor learned for the host (timing.profile).
+    """
+    host = params.get("host")
+    params = timing.profile.tune(params)
+    if getattr(pool, "instrumented", False):
+        # The pool opens its sessions through connect() itself (output_cache.CachedPool)
+        with pool.session(params) as net_connect:
+            yield net_connect
+        return
+    if pool is not None:
+        begin = time.monotonic()
+        with pool.session(params) as net_connect:
+            metrics.observe("connect", time.monotonic() - begin, host)
+            yield metrics.InstrumentedConnection(timing.AdaptiveConnection(net_connect, host), host)
+        return
+
+    begin = time.monotonic()
+    with metrics.span("connect", host):
+        net_connect = ConnectHandler(**params)
+    # Only new sessions, a warm one from the pool says nothing about the device
+    timing.profile.observe(host, "connect", time.monotonic() - begin)
+    try:
+        yield metrics.InstrumentedConnection(timing.AdaptiveConnection(net_connect, host), host)
+    finally:
+        try:
+            net_connect.disconnect()
+        except Exception:
+            logger.debug("disconnect failed", exc_info=True, extra={"host": host})
+
+
+def _transport_owner(net_connect):
+    """
+    Innermost connection under the wrappers (metrics, timing, cache), None when there is none yet.
+    __dict__ and not getattr(): the wrappers forward unknown attributes, the cache would connect.
+    """
+    while net_connect is not None and "connection" in getattr(net_connect, "__dict__", {}):
+        net_connect = net_connect.__dict__["connection"]
+    return net_connect
+
+
+def abort(net_connect):
+    """
+    Close the transport under a session another thread is using, its next read or write fails
+    right away. disconnect() would wait for the channel lock held by that thread.
+    """
+    owner = _transport_owner(net_connect)
+    if owner is None:
+        return
+    for name in ("remote_conn_pre", "remote_conn"):
+        transport = getattr(owner, "__dict__", {}).get(name)
+        if transport is None:
+            continue
+        try:
+            transport.close()
+        except Exception:
+            logger.debug("close failed", exc_info=True)
+
+
+def _record(result):
+    metrics.inc("fleet_devices", status=result.status)
+    metrics.emit("device_done", host=result.host, status=result.status, error=result.error, elapsed=result.elapsed)
+
+
+def run_device(device, task, connection_params, site=NO_SITE, started=None, pool=None, journal=None,
+               sessions=None):
+    """
+    Connect, run the task and disconnect one device, errors end up on the DeviceResult status.
+    The open session is kept on sessions (host -> connection) so a watchdog can abort it.
+    """
+    host = str(device)
+    result = DeviceResult(host=host, site=site)
+    begin = time.monotonic()
+    if started is not None:
+        started[host] = begin
+    metrics.emit("device_connecting", host=host)
+    # Transcripts only for new sessions, pooled ones outlive a single device run
+    if pool is None:
+        params, transcript = with_transcript(connection_params(host))
+    else:
+        params, transcript = connection_params(host), None
+    try:
+        with connect(params, pool) as net_connect:
+            if sessions is not None:
+                sessions[host] = net_connect
+            if journal is not None:
+                journal.connected(host)
+            result.data = task(net_connect, device)
+    except NetmikoTimeoutException as error:
+        result.status, result.error = TIMEOUT, str(error)
+    except AuthenticationException as error:
+        result.status, result.error = AUTH_FAILURE, str(error)
+    except EOFError as error:
+        result.status, result.error = EOF, str(error)
+    except SSHException as error:
+        result.status, result.error = SSH_ERROR, str(error)
+    except UnsupportedPlatform as error:
+        result.status, result.error = UNSUPPORTED, str(error)
+    except Exception as unknown_error:
+        result.status, result.error = ERROR, str(unknown_error)
+    finally:
+        if sessions is not None:
+            sessions.pop(host, None)
+    result.elapsed = time.monotonic() - begin
+    if started is not None and host not in started:
+        return result
+    if result.status != OK:
+        keep_transcript(host, transcript)
+    if journal is not None:
+        journal.finished(result)
+    _record(result)
+    logger.info("finished with status %s in %.2fs", result.status, result.elapsed, extra={"host": host})
+    return result
+
+
+def run_fleet(devices, task, connection_params, max_workers=32, per_site=8, timeout=300, site_of=default_site, pool=None,
+              journal=None):
+    """
+    Run task(net_connect, device) on every device and return a FleetSummary.
+
+    connection_params is one of the net_conn helpers (host -> netmiko dict), the connection is
+    opened and disconnected here so the task only has to send commands. With a session pool the
+    sessions are taken from it and given back at the end instead, without one they come from the
+    session broker daemon when it is running. Every device state goes to the journal
+    (journal.Journal) when there is one.
+    """
+    run_start = time.monotonic()
+    if pool is None:
+        pool = shared_pool(local=None)
+    summary = FleetSummary()
+    started = {}
+    sessions = {}
+    futures = {}
+    queued = defaultdict(deque)
+
+    for device in devices:
+        if journal is not None:
+            journal.pending(str(device))
+        queued[site_of(device)].append(device)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def submit_next(site):
+        if queued[site]:
+            device = queued[site].popleft()
+            future = executor.submit(run_device, device, task, connection_params, site, started, pool, journal,
+                                     sessions)
+            futures[future] = (str(device), site)
+            pending.add(future)
+
+    # per_site devices of every site to start with, one site after the other so they share the workers
+    limits = {site: max_workers if site == NO_SITE else per_site for site in queued}
+    pending = set()
+    for turn in range(max(limits.values(), default=0)):
+        for site, limit in limits.items():
+            if turn < limit:
+                submit_next(site)
+
+    while pending:
+        done, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+        for future in done:
+            summary.results.append(future.result())
+            submit_next(futures[future][1])
+
+        # Devices stuck longer than the timeout are reported and their session closed under them
+        now = time.monotonic()
+        for future in list(pending):
+            host, site = futures[future]
+            if host in started and now - started[host] > timeout:
+                pending.discard(future)
+                # Forgotten here, so the thread does not record it again when it finally returns
+                begin = started.pop(host)
+                net_connect = sessions.get(host)
+                if net_connect is not None:
+                    abort(net_connect)
+                result = DeviceResult(host=host, site=site, status=TIMEOUT,
+                                      error=f"no answer after {timeout}s", elapsed=now - begin)
+                if journal is not None:
+                    journal.finished(result)
+                _record(result)
+                summary.results.append(result)
+                submit_next(site)
+
+    executor.shutdown(wait=False, cancel_futures=True)
+    summary.elapsed = time.monotonic() - run_start
+    return summary
@@ -0,0 +1,105 @@
+import re
+from collections import namedtuple
+
+"""
+Interface names and "show interface status" per platform
+
+Names are normalized to the short form the switch prints on "show interface status" (Gi1/0/1,
+Te1/1/1, Eth1/1, Po10), from long names, abbreviations or the DellOS9 "Te 1/1" form, so the
+outputs of different commands can be compared. Status lines are parsed with one precompiled
+pattern per platform in a single pass, the header and the separators do not match.
+"""
+
+InterfaceStatus = namedtuple("InterfaceStatus", ["port", "name", "status", "vlan", "duplex", "speed", "type"])
+
+# Long names as the switch prints on "show interface" or the running-config -> short names
+ABBREVIATIONS = {
+    "FastEthernet": "Fa",
+    "GigabitEthernet": "Gi",
+    "TwoGigabitEthernet": "Tw",
+    "FiveGigabitEthernet": "Fi",
+    "TenGigabitEthernet": "Te",
+    "TwentyFiveGigE": "Twe",
+    "FortyGigabitEthernet": "Fo",
+    "fortyGigE": "Fo",
+    "HundredGigE": "Hu",
+    "Ethernet": "Eth",
+    "Port-channel": "Po",
+    "ManagementEthernet": "Ma",
+    "Loopback": "Lo",
+    "Vlan": "Vlan",
+}
+
+# Any spelling of the type (long or short, any case) -> short name
+_TYPES = {}
+for _long, _short in ABBREVIATIONS.items():
+    _TYPES[_long.lower()] = _short
+    _TYPES[_short.lower()] = _short
+
+name_pattern = re.compile(r"^(?P<type>[A-Za-z][A-Za-z-]*?)\s?(?P<number>\d+(?:/\d+)*(?:\.\d+)?)$")
+
+# Status column on IOS and NX-OS
+STATUS_KEYWORDS = (
+    "connected", "notconnect", "notconnec", "disabled", "err-disabled", "xcvrAbsen", "sfpAbsent",
+    "noOperMem", "down", "up", "inactive", "monitoring", "suspnd", "suspended", "linkFlapE",
+)
+
+_status = "|".join(sorted(STATUS_KEYWORDS, key=len, reverse=True))
+
+# The description can have spaces and be empty, so each line is anchored on the status column.
+# The name is greedy: a status word inside a description is taken as part of it.
+_cisco = re.compile(
+    rf"^(?P<port>[A-Za-z][\w/.-]*\d)\s+(?P<name>.*)(?<!\S)(?P<status>{_status})\s+(?P<vlan>\S+)"
+    r"\s+(?P<duplex>\S+)\s+(?P<speed>\S+)(?:\s+(?P<type>.*?))?\s*$"
+)
+
+STATUS_PATTERNS = {
+    # Gi1/0/1   LIVRE    notconnect   1            auto   auto 10/100/1000BaseTX
+    "IOS": _cisco,
+    # Eth1/1    LIVRE    xcvrAbsen    1         auto    auto    --
+    "NX-OS": _cisco,
+    # Te 1/1    LIVRE    Down   Auto         Auto   --
+    "DellOS9": re.compile(
+        r"^(?P<port>[A-Za-z]+ \d+(?:/\d+)*)\s+(?P<name>.*)(?<!\S)(?P<status>Up|Down)"
+        r"\s+(?P<speed>Auto|\d+ \S+)\s+(?P<duplex>\S+)\s+(?P<vlan>\S+)\s*$"
+    ),
+}
+
+
+def short_name(interface):
+    """
+    GigabitEthernet1/0/1, gi1/0/1 or "TenGigabitEthernet 1/1" -> Gi1/0/1, Te1/1. Unknown names are kept.
+    """
+    interface = interface.strip()
+    match = name_pattern.match(interface)
+    if not match:
+        return interface
+    short = _TYPES.get(match.group("type").lower())
+    if short is None:
+        return interface
+    return short + match.group("number")
+
+
+def parse_status(output, platform="IOS"):
+    """
+    {short port name: InterfaceStatus} of "show interface status", filtered ("| in ...") or not
+    """
+    pattern = STATUS_PATTERNS.get(platform, STATUS_PATTERNS["IOS"])
+    ports = {}
+    for line in output.splitlines():
+        match = pattern.match(line)
+        if match:
+            fields = match.groupdict()
+            port = short_name(fields["port"])
+            ports[port] = InterfaceStatus(
+                port, fields["name"].strip(), fields["status"], fields["vlan"], fields["duplex"],
+                fields["speed"], fields.get("type") or "",
+            )
+    return ports
+
+
+def with_status(output, platform, *statuses):
+    """
+    Ports of a "show interface status" output in one of the statuses, in the order of the output
+    """
+    return [port for port, state in parse_status(output, platform).items() if state.status in statuses]
@@ -0,0 +1,187 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple
+from datetime import datetime, timezone
+from fleet import read_hosts
+import sqlite3
+import os
+
+"""
+Local inventory of Netbox devices
+
+Devices are kept on a SQLite file indexed by platform, site, model and role, so the scripts pick
+their targets in milliseconds instead of walking the Netbox API on every run. The cache is
+refreshed incrementally with last_updated__gte, and a full sync (fetching the pages concurrently)
+runs on the first use and every FULL_SYNC_INTERVAL to catch deleted devices.
+
+Filters come from the command line (add_arguments) or from INVENTORY_FILTER on .env, for example
+INVENTORY_FILTER="platform=cisco-ios site=br-lp". Without filters the "hosts" file is used.
+"""
+
+DB_FILE = "inventory.sqlite"
+PAGE_SIZE = 500
+PAGE_WORKERS = 8
+REFRESH_INTERVAL = 5 * 60
+FULL_SYNC_INTERVAL = 24 * 60 * 60
+
+FILTERS = ("platform", "site", "model", "role")
+
+COLUMNS = ("id", "name", "primary_ip", "platform", "site", "model", "role", "status", "last_updated")
+
+
+class Device(namedtuple("Device", COLUMNS)):
+    """
+    str() is the name like a pynetbox record, so the scripts use it the same way
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        return self.name
+
+
+def connect(filename=DB_FILE):
+    db = sqlite3.connect(filename)
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS devices ("
+        "id INTEGER PRIMARY KEY, name TEXT, primary_ip TEXT, platform TEXT, site TEXT,"
+        " model TEXT, role TEXT, status TEXT, last_updated TEXT)"
+    )
+    for column in FILTERS:
+        db.execute(f"CREATE INDEX IF NOT EXISTS devices_{column} ON devices ({column})")
+    db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    return db
+
+
+def _slug(value):
+    return getattr(value, "slug", None) if value is not None else None
+
+
+def to_row(record):
+    primary_ip = getattr(record, "primary_ip", None)
+    device_type = getattr(record, "device_type", None)
+    # Netbox < 3.6 calls the role "device_role"
+    role = getattr(record, "role", None) or getattr(record, "device_role", None)
+    status = getattr(record, "status", None)
+    return (
+        record.id,
+        record.name,
+        str(primary_ip.address).split("/")[0] if primary_ip else None,
+        _slug(getattr(record, "platform", None)),
+        _slug(getattr(record, "site", None)),
+        getattr(device_type, "model", None),
+        _slug(role),
+        getattr(status, "value", status),
+        str(getattr(record, "last_updated", "") or ""),
+    )
+
+
+def _get_meta(db, key):
+    row = db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def _set_meta(db, key, value):
+    db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+def full_sync(db, nb):
+    """
+    All pages fetched at the same time, then the table is replaced in one transaction
+    """
+    # Taken before the first request, the next incremental sync picks up what changes meanwhile
+    now = datetime.now(timezone.utc).isoformat()
+    total = nb.dcim.devices.count()
+    offsets = range(0, total, PAGE_SIZE)
+
+    def page(offset):
+        return [to_row(record) for record in nb.dcim.devices.filter(limit=PAGE_SIZE, offset=offset)]
+
+    with ThreadPoolExecutor(max_workers=PAGE_WORKERS) as executor:
+        pages = list(executor.map(page, offsets))
+
+    with db:
+        db.execute("DELETE FROM devices")
+        for rows in pages:
+            db.executemany(f"INSERT OR REPLACE INTO devices VALUES ({','.join('?' * len(COLUMNS))})", rows)
+        _set_meta(db, "last_sync", now)
+        _set_meta(db, "last_full_sync", now)
+
+
+def incremental_sync(db, nb):
+    since = _get_meta(db, "last_sync")
+    now = datetime.now(timezone.utc).isoformat()
+    rows = [to_row(record) for record in nb.dcim.devices.filter(last_updated__gte=since)]
+    with db:
+        db.executemany(f"INSERT OR REPLACE INTO devices VALUES ({','.join('?' * len(COLUMNS))})", rows)
+        _set_meta(db, "last_sync", now)
+    return len(rows)
+
+
+def _age(db, key):
+    value = _get_meta(db, key)
+    if value is None:
+        return None
+    return (datetime.now(timezone.utc) - datetime.fromisoformat(value)).total_seconds()
+
+
+def sync(db, nb=None, force_full=False):
+    """
+    Refresh the cache only when it is older than REFRESH_INTERVAL
+    """
+    full_age = _age(db, "last_full_sync")
+    sync_age = _age(db, "last_sync")
+    if not force_full and sync_age is not None and sync_age < REFRESH_INTERVAL:
+        return
+    if nb is None:
+        import auth
+
+        nb = auth.nb
+    if force_full or full_age is None or full_age > FULL_SYNC_INTERVAL:
+        full_sync(db, nb)
+    else:
+        incremental_sync(db, nb)
+
+
+def select(db, **filters):
+    where = []
+    values = []
+    for column in FILTERS:
+        if filters.get(column):
+            where.append(f"{column} = ?")
+            values.append(filters[column])
+    query = f"SELECT {', '.join(COLUMNS)} FROM devices"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    return [Device(*row) for row in db.execute(query + " ORDER BY name", values)]
+
+
+def env_filters():
+    filters = {}
+    for item in os.environ.get("INVENTORY_FILTER", "").split():
+        key, _, value = item.partition("=")
+        if key in FILTERS and value:
+            filters[key] = value
+    return filters
+
+
+def hosts(hosts_file="hosts", **filters):
+    """
+    Targets of a run: Netbox devices matching the filters, or the hosts file without filters
+    """
+    filters = {key: value for key, value in filters.items() if value} or env_filters()
+    if not filters:
+        return read_hosts(hosts_file)
+    db = connect()
+    try:
+        sync(db)
+        return select(db, **filters)
+    finally:
+        db.close()
+
+
+def add_arguments(parser):
+    for column in FILTERS:
+        parser.add_argument(f"--{column}", help=f"Netbox {column} of the devices (inventory cache)")
+
+
+def from_args(args, hosts_file="hosts"):
+    return hosts(hosts_file, **{column: getattr(args, column) for column in FILTERS})
@@ -0,0 +1,155 @@
+from datetime import datetime, timezone
+from fleet import run_fleet, FleetSummary, OK, AUTH_FAILURE, TIMEOUT, UNSUPPORTED
+from colorama import Fore
+import threading
+import json
+import os
+import time
+
+"""
+Run journal, so a fleet run that died halfway goes on where it stopped
+
+Every device state change is appended as one JSON line (pending, connected, remediated or
+failed, with the time and how long the device took). With --resume the devices already
+remediated on the journal are skipped. With --retries N the failed ones run again with
+exponential backoff (RETRY_BASE, 2x, 4x... up to RETRY_MAX seconds) for N more rounds.
+Authentication failures and unsupported platforms are not retried, nor devices the watchdog gave up on after they
+connected: their thread may still be on the switch, a new session would configure it twice.
+
+A journal of an interrupted run (devices still pending or connected) is never overwritten by a
+new run, --resume goes on with it and --new-journal starts over. A new run over a finished
+journal keeps the previous one as <journal>.1.
+
+    python switch_hardening.py --site br-lp
+    python switch_hardening.py --site br-lp --resume --retries 2
+"""
+
+PENDING = "pending"
+CONNECTED = "connected"
+REMEDIATED = "remediated"
+FAILED = "failed"
+
+RETRIES = 0
+RETRY_BASE = 5
+RETRY_MAX = 60
+
+
+class Journal:
+    def __init__(self, filename, resume=False, overwrite=False):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.states = self.load(filename)
+        interrupted = any(entry["state"] in (PENDING, CONNECTED) for entry in self.states.values())
+        if not resume and not overwrite and interrupted:
+            raise FileExistsError(
+                f"{filename} is from an interrupted run, use --resume to go on or --new-journal to start over"
+            )
+        if not resume:
+            self.states = {}
+            if os.path.exists(filename):
+                os.replace(filename, filename + ".1")
+        # A new run starts a new journal, a resumed one appends to it
+        self.file = open(filename, "a" if resume else "w")
+
+    @staticmethod
+    def load(filename):
+        """
+        {host: last journal entry}, an empty journal when the file does not exist
+        """
+        states = {}
+        try:
+            with open(filename) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Last line cut by the crash
+                        continue
+                    states[entry["host"]] = entry
+        except FileNotFoundError:
+            pass
+        return states
+
+    def write(self, host, state, **fields):
+        entry = {"time": datetime.now(timezone.utc).isoformat(), "host": host, "state": state, **fields}
+        with self.lock:
+            attempts = self.states.get(host, {}).get("attempt", 0)
+            entry["attempt"] = attempts + 1 if state == PENDING else attempts
+            self.states[host] = entry
+            self.file.write(json.dumps(entry) + "\n")
+            self.file.flush()
+
+    # Called by fleet.run_fleet and fleet.run_device
+
+    def pending(self, host):
+        self.write(host, PENDING)
+
+    def connected(self, host):
+        self.write(host, CONNECTED)
+
+    def finished(self, result):
+        if result.status == OK:
+            self.write(result.host, REMEDIATED, elapsed=round(result.elapsed, 3))
+        else:
+            connected = self.states.get(result.host, {}).get("state") == CONNECTED
+            self.write(result.host, FAILED, elapsed=round(result.elapsed, 3), status=result.status, error=result.error,
+                       connected=connected)
+
+    def done(self, host):
+        return self.states.get(host, {}).get("state") == REMEDIATED
+
+    def unfinished(self, devices):
+        return [device for device in devices if not self.done(str(device))]
+
+    def retryable(self, host):
+        """
+        False for authentication failures, unsupported platforms and timeouts after the device connected (the thread
+        the watchdog gave up on may still be sending commands)
+        """
+        entry = self.states.get(host, {})
+        if entry.get("status") in (AUTH_FAILURE, UNSUPPORTED):
+            return False
+        return not (entry.get("status") == TIMEOUT and entry.get("connected"))
+
+    def close(self):
+        self.file.close()
+
+
+def backoff(attempt, base=RETRY_BASE, maximum=RETRY_MAX):
+    return min(maximum, base * 2 ** attempt)
+
+
+def run_resumable(devices, task, connection_params, journal, retries=RETRIES, **kwargs):
+    """
+    run_fleet on the devices not remediated yet, failed devices run again after a backoff.
+    The summary has the last result of every device of this run.
+    """
+    run_start = time.monotonic()
+    todo = journal.unfinished(devices)
+    if len(todo) < len(devices):
+        print(Fore.BLUE + f"Skipping {len(devices) - len(todo)} devices already done on {journal.filename}" + Fore.RESET)
+
+    results = {}
+    for attempt in range(retries + 1):
+        summary = run_fleet(todo, task, connection_params, journal=journal, **kwargs)
+        for result in summary.results:
+            results[result.host] = result
+        retry = {result.host for result in summary.failed if journal.retryable(result.host)}
+        if not retry or attempt == retries:
+            break
+        delay = backoff(attempt)
+        print(Fore.YELLOW + f"Retrying {len(retry)} devices in {delay}s" + Fore.RESET)
+        time.sleep(delay)
+        todo = [device for device in todo if str(device) in retry]
+
+    return FleetSummary(results=list(results.values()), elapsed=time.monotonic() - run_start)
+
+
+def add_arguments(parser):
+    parser.add_argument("--resume", action="store_true", help="skip the devices already done on the journal")
+    parser.add_argument("--new-journal", action="store_true", help="start a new journal even with devices not done")
+    parser.add_argument("--retries", type=int, default=RETRIES, help="rounds of retries for failed devices (none by default)")
+
+
+def from_args(args, filename):
+    return Journal(filename, resume=args.resume, overwrite=args.new_journal)
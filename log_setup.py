@@ -0,0 +1,108 @@
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import atexit
+import gzip
+import io
+import json
+import logging
+import os
+import queue
+import shutil
+
+"""
+Logging for the scripts, replaces logging.basicConfig(level=DEBUG) on netmiko_global.log
+
+Records go to a queue and a QueueListener thread writes them, so send_command never waits on the
+disk. Each record is one JSON line with the device host when there is one, the file is rotated
+and old files are gzip compressed. paramiko stays at WARNING by default. Full session transcripts
+are kept in memory and only written (to TRANSCRIPTS_DIR) for devices that failed.
+"""
+
+LOG_FILE = "netmiko_global.log"
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 5
+
+# Level per library, anything else uses the level given to setup_logging
+LIBRARY_LEVELS = {
+    "paramiko": logging.WARNING,
+    "netmiko": logging.INFO,
+}
+
+TRANSCRIPTS_DIR = None
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        host = getattr(record, "host", None)
+        if host:
+            data["host"] = host
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data)
+
+
+def _gzip_namer(name):
+    return name + ".gz"
+
+
+def _gzip_rotator(source, dest):
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def setup_logging(filename=LOG_FILE, level=logging.INFO, library_levels=None, transcripts=None):
+    """
+    Call once at the start of a script, calling it again does nothing
+    """
+    global _listener, TRANSCRIPTS_DIR
+    if _listener is not None:
+        return
+
+    file_handler = RotatingFileHandler(filename, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT)
+    file_handler.namer = _gzip_namer
+    file_handler.rotator = _gzip_rotator
+    file_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(level)
+    for name, library_level in {**LIBRARY_LEVELS, **(library_levels or {})}.items():
+        logging.getLogger(name).setLevel(library_level)
+
+    _listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    if transcripts:
+        os.makedirs(transcripts, exist_ok=True)
+        TRANSCRIPTS_DIR = transcripts
+
+
+def with_transcript(params):
+    """
+    netmiko params writing the session log to memory, (params, buffer) or (params, None) when off
+    """
+    if TRANSCRIPTS_DIR is None:
+        return params, None
+    buffer = io.BytesIO()
+    return {**params, "session_log": buffer}, buffer
+
+
+def keep_transcript(host, buffer):
+    """
+    Only called for devices that failed, the others just drop the buffer
+    """
+    if buffer is None or TRANSCRIPTS_DIR is None:
+        return
+    path = os.path.join(TRANSCRIPTS_DIR, f"{host}.log")
+    with open(path, "wb") as f:
+        f.write(buffer.getvalue())
@@ -0,0 +1,69 @@
+import re
+from collections import namedtuple, defaultdict
+
+"""
+MAC address table collector
+
+The whole table comes with one command per device and each line is parsed as it is read,
+then the VLAN filter runs locally. Before this the scripts sent "show mac-address vlan X"
+for every VLAN of the range, one prompt round-trip each.
+"""
+
+MacEntry = namedtuple("MacEntry", ["vlan", "mac", "port", "type"])
+
+# One command with the full table per platform
+MAC_TABLE_COMMANDS = {
+    "DellOS9": "show mac-address-table",
+    "NX-OS": "show mac address-table",
+    "IOS": "show mac address-table",
+}
+
+# Line patterns per platform, the header and the legend lines do not match
+MAC_LINE_PATTERNS = {
+    # 2400    00:11:22:33:44:55   Dynamic     Te 1/1      Active
+    "DellOS9": re.compile(
+        r"^\s*(?P<vlan>\d+)\s+(?P<mac>(?:[0-9A-Fa-f]{2}:){5}[0-9A-Fa-f]{2})\s+(?P<type>\S+)"
+        r"\s+(?P<port>[A-Za-z-]+ ?\d[\d/:.]*|\S+)"
+    ),
+    # * 372     0011.2233.4455   dynamic  0         F      F    Eth1/1
+    "NX-OS": re.compile(
+        r"^[*+GORC ]*?(?P<vlan>\d+)\s+(?P<mac>[0-9a-fA-F]{4}\.[0-9a-fA-F]{4}\.[0-9a-fA-F]{4})\s+(?P<type>\S+)"
+        r"(?:\s+\S+){3}\s+(?P<port>\S+)"
+    ),
+    #   10    0011.2233.4455    DYNAMIC     Gi1/0/1
+    "IOS": re.compile(
+        r"^\s*(?P<vlan>\d+)\s+(?P<mac>[0-9a-fA-F]{4}\.[0-9a-fA-F]{4}\.[0-9a-fA-F]{4})\s+(?P<type>\S+)"
+        r"\s+(?P<port>\S+)"
+    ),
+}
+
+
+def parse_mac_table(output, platform, vlans=None):
+    """
+    Generator of MacEntry, only VLANs inside "vlans" when it is given
+    """
+    pattern = MAC_LINE_PATTERNS[platform]
+    wanted = set(vlans) if vlans is not None else None
+    for line in output.splitlines():
+        match = pattern.match(line)
+        if not match:
+            continue
+        vlan = int(match.group("vlan"))
+        if wanted is not None and vlan not in wanted:
+            continue
+        yield MacEntry(vlan, match.group("mac").lower(), match.group("port"), match.group("type").lower())
+
+
+def index_by_vlan(entries):
+    index = defaultdict(list)
+    for entry in entries:
+        index[entry.vlan].append(entry)
+    return index
+
+
+def collect_mac_table(net_connect, platform, vlans=None):
+    """
+    One command per device and a {vlan: [MacEntry]} index of the VLANs asked
+    """
+    output = net_connect.send_command(MAC_TABLE_COMMANDS[platform])
+    return index_by_vlan(parse_mac_table(output, platform, vlans))
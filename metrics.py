@@ -0,0 +1,167 @@
+from contextlib import contextmanager
+from colorama import Fore
+import threading
+import time
+
+"""
+Timing spans, counters and OpenMetrics export for the fleet runs
+
+Every device gets a span per phase (netbox, connect, send_command, send_config_set) that goes to a
+histogram per phase and to a per-device total, so a slow run shows where the time went and which
+switches were slow. Events (device connecting, done, failed) go to the listeners, the console
+listener prints them with colorama instead of prints spread over the scripts.
+"""
+
+BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, float("inf"))
+
+_lock = threading.Lock()
+# (name, labels) -> value
+counters = {}
+# phase -> [bucket counts, sum, count]
+histograms = {}
+# host -> seconds spent on all phases
+device_seconds = {}
+listeners = []
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        counters[key] = counters.get(key, 0) + amount
+
+
+def observe(phase, seconds, host=None):
+    with _lock:
+        buckets, total, count = histograms.get(phase, ([0] * len(BUCKETS), 0.0, 0))
+        for index, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                buckets[index] += 1
+        histograms[phase] = (buckets, total + seconds, count + 1)
+        if host is not None:
+            device_seconds[host] = device_seconds.get(host, 0.0) + seconds
+
+
+@contextmanager
+def span(phase, host=None):
+    begin = time.monotonic()
+    try:
+        yield
+    finally:
+        observe(phase, time.monotonic() - begin, host)
+
+
+def emit(event, **fields):
+    for listener in listeners:
+        listener(event, fields)
+
+
+def reset():
+    with _lock:
+        counters.clear()
+        histograms.clear()
+        device_seconds.clear()
+
+
+class InstrumentedConnection:
+    """
+    Netmiko connection with a span on every send_command / send_config_set
+    """
+    def __init__(self, connection, host):
+        self.connection = connection
+        self.host = host
+
+    def send_command(self, *args, **kwargs):
+        with span("send_command", self.host):
+            return self.connection.send_command(*args, **kwargs)
+
+    def send_config_set(self, *args, **kwargs):
+        try:
+            with span("send_config_set", self.host):
+                return self.connection.send_config_set(*args, **kwargs)
+        finally:
+            # Even a failed push may have changed part of the config
+            emit("config_pushed", host=self.host)
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+
+"""
+Console output built from the events
+"""
+FAILURE_MESSAGES = {
+    "timeout": "Timeout to device: {host}",
+    "auth_failure": "Authentication failure: {host}",
+    "eof": "End of file while attempting device {host}",
+    "ssh_error": "SSH Issue. Are you sure SSH is enabled? {host}",
+    "unsupported": "Unsupported platform on {host}: {error}",
+    "error": "Some other error on {host}: {error}",
+}
+
+
+def console_listener(event, fields):
+    if event == "device_connecting":
+        print(Fore.BLUE + f"Connecting to the device: {fields['host']}" + Fore.RESET)
+    elif event == "device_done" and fields["status"] == "ok":
+        print(Fore.GREEN + f"Done: {fields['host']} in {fields['elapsed']:.1f}s" + Fore.RESET)
+    elif event == "device_done":
+        print(Fore.RED + FAILURE_MESSAGES[fields["status"]].format(**fields) + Fore.RESET)
+
+
+def enable_console():
+    if console_listener not in listeners:
+        listeners.append(console_listener)
+
+
+"""
+OpenMetrics text format
+"""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def openmetrics_text():
+    lines = []
+    with _lock:
+        names = sorted({name for name, _ in counters})
+        for name in names:
+            lines.append(f"# TYPE {name} counter")
+            for (counter_name, labels), value in sorted(counters.items()):
+                if counter_name == name:
+                    lines.append(f"{name}_total{_format_labels(labels)} {value}")
+
+        lines.append("# TYPE fleet_phase_seconds histogram")
+        for phase, (buckets, total, count) in sorted(histograms.items()):
+            for bound, bucket_count in zip(BUCKETS, buckets):
+                le = "+Inf" if bound == float("inf") else bound
+                lines.append(f'fleet_phase_seconds_bucket{{phase="{_escape(phase)}",le="{le}"}} {bucket_count}')
+            lines.append(f'fleet_phase_seconds_sum{{phase="{_escape(phase)}"}} {total:.6f}')
+            lines.append(f'fleet_phase_seconds_count{{phase="{_escape(phase)}"}} {count}')
+
+        lines.append("# TYPE fleet_device_seconds gauge")
+        for host, seconds in sorted(device_seconds.items()):
+            lines.append(f'fleet_device_seconds{{host="{_escape(host)}"}} {seconds:.6f}')
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+def write_openmetrics(filename="fleet_metrics.prom"):
+    with open(filename, "w") as f:
+        f.write(openmetrics_text())
+
+
+def slowest(count=5):
+    with _lock:
+        return sorted(device_seconds.items(), key=lambda item: item[1], reverse=True)[:count]
@@ -0,0 +1,235 @@
+from contextlib import contextmanager, ExitStack
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+import metrics
+from session_pool import shared_pool
+
+"""
+Cache of "show" command outputs for the read-only tshoot collectors
+
+Outputs are kept on a SQLite file by content (sha256, zlib compressed, identical outputs are
+stored once) and indexed by (host, command) with the time they were fetched. Each command has
+its own TTL (longest prefix on COMMAND_TTL), the least recently used entries are evicted past
+MAX_ENTRIES or MAX_BYTES, and every config push (fleet connections emit "config_pushed") drops
+the entries of that host.
+
+CachedPool plugs into run_fleet / async_collect like the other pools: the SSH session is only
+opened on the first miss, so a device answered from the cache is never connected to. That session
+comes from fleet.connect, so the connect and the commands that reach the device are timed on the
+metrics and the timing profile, and cache hits are not (they say nothing about the device).
+
+    run(inventory.hosts(), task, driver.params, callback, pool=CachedPool())
+"""
+
+# Next to the scripts whatever the working directory, so a push from anywhere invalidates it
+CACHE_FILE = os.environ.get("OUTPUT_CACHE_FILE") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "output_cache.sqlite"
+)
+MAX_ENTRIES = 20000
+MAX_BYTES = 200 * 1024 * 1024
+
+# Seconds an output stays valid, by command prefix. 0 is never cached.
+COMMAND_TTL = {
+    "show version": 60 * 60,
+    "show hostname": 60 * 60,
+    "show running-config": 5 * 60,
+    "show run": 5 * 60,
+    "show vlan": 2 * 60,
+    "show interface": 30,
+    "show mac address-table": 30,
+    "show mac-address-table": 30,
+    "show spanning-tree": 30,
+    "show clock": 0,
+}
+DEFAULT_TTL = 60
+
+# send_command options that change what comes back, those calls are not cached
+PARSING_OPTIONS = ("use_textfsm", "use_genie", "use_ttp", "textfsm_template", "ttp_template")
+
+
+def ttl(command):
+    best = None
+    for prefix in COMMAND_TTL:
+        if command.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return COMMAND_TTL[best] if best is not None else DEFAULT_TTL
+
+
+class OutputCache:
+    def __init__(self, filename=CACHE_FILE, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.filename = filename
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # The collectors run every device on its own thread
+        self.db = sqlite3.connect(filename, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS entries (host TEXT, command TEXT, digest TEXT, fetched REAL,"
+            " used REAL, PRIMARY KEY (host, command))"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER, content BLOB)")
+
+    def get(self, host, command):
+        """
+        Output still inside the TTL of the command, None otherwise
+        """
+        max_age = ttl(command)
+        if max_age <= 0:
+            return None
+        now = time.time()
+        with self.lock:
+            row = self.db.execute(
+                "SELECT entries.digest, entries.fetched, blobs.content FROM entries JOIN blobs USING (digest)"
+                " WHERE host = ? AND command = ?",
+                (host, command),
+            ).fetchone()
+            if row is None or now - row[1] > max_age:
+                return None
+            with self.db:
+                self.db.execute("UPDATE entries SET used = ? WHERE host = ? AND command = ?", (now, host, command))
+        metrics.inc("output_cache_hits")
+        return zlib.decompress(row[2]).decode()
+
+    def put(self, host, command, output):
+        if ttl(command) <= 0:
+            return
+        data = output.encode()
+        digest = hashlib.sha256(data).hexdigest()
+        now = time.time()
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR IGNORE INTO blobs (digest, size, content) VALUES (?, ?, ?)",
+                (digest, len(data), zlib.compress(data)),
+            )
+            self.db.execute(
+                "INSERT OR REPLACE INTO entries (host, command, digest, fetched, used) VALUES (?, ?, ?, ?, ?)",
+                (host, command, digest, now, now),
+            )
+            self._evict()
+
+    def _evict(self):
+        """
+        Least recently used entries out until both limits are met, then the blobs nobody uses.
+        Called with the lock held, inside a transaction.
+        """
+        (entries,) = self.db.execute("SELECT COUNT(*) FROM entries").fetchone()
+        (size,) = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        if entries <= self.max_entries and size <= self.max_bytes:
+            return
+        for host, command, digest in self.db.execute(
+            "SELECT host, command, digest FROM entries ORDER BY used"
+        ).fetchall():
+            if entries <= self.max_entries and size <= self.max_bytes:
+                break
+            self.db.execute("DELETE FROM entries WHERE host = ? AND command = ?", (host, command))
+            entries -= 1
+            if self.db.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone() is None:
+                (blob_size,) = self.db.execute("SELECT size FROM blobs WHERE digest = ?", (digest,)).fetchone()
+                self.db.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+                size -= blob_size
+
+    def invalidate(self, host):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM entries WHERE host = ?", (host,))
+            self.db.execute("DELETE FROM blobs WHERE digest NOT IN (SELECT digest FROM entries)")
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def default_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = OutputCache()
+        return _cache
+
+
+def _on_event(event, fields):
+    # Any config pushed on a device makes its cached outputs useless
+    if event == "config_pushed" and (_cache is not None or os.path.exists(CACHE_FILE)):
+        default_cache().invalidate(fields["host"])
+
+
+metrics.listeners.append(_on_event)
+
+
+class CachedConnection:
+    """
+    Netmiko connection opened on the first command the cache cannot answer
+    """
+    def __init__(self, cache, params, pool=None):
+        self.cache = cache
+        self.params = params
+        self.host = params.get("host")
+        self.pool = pool
+        self.stack = ExitStack()
+        self.connection = None
+
+    def _connect(self):
+        if self.connection is None:
+            # fleet imports this module for the invalidation listener
+            from fleet import connect
+
+            self.connection = self.stack.enter_context(connect(self.params, self.pool))
+        return self.connection
+
+    def send_command(self, command_string, *args, **kwargs):
+        cacheable = command_string.startswith("show") and not args and not any(kwargs.get(option) for option in PARSING_OPTIONS)
+        if cacheable:
+            output = self.cache.get(self.host, command_string)
+            if output is not None:
+                return output
+        output = self._connect().send_command(command_string, *args, **kwargs)
+        if cacheable and isinstance(output, str):
+            self.cache.put(self.host, command_string, output)
+        return output
+
+    def send_config_set(self, *args, **kwargs):
+        return self._connect().send_config_set(*args, **kwargs)
+
+    def close(self):
+        self.stack.close()
+
+    def __getattr__(self, name):
+        return getattr(self._connect(), name)
+
+
+class CachedPool:
+    """
+    Pool for run_fleet / async_collect answering "show" commands from the cache, misses go to the
+    inner pool (session_pool, replay...) or to a new SSH session
+    """
+    # The sessions are opened (and timed) through fleet.connect already
+    instrumented = True
+
+    def __init__(self, cache=None, pool=None):
+        self.cache = cache if cache is not None else default_cache()
+        # Misses without an inner pool go to the session broker daemon when it is running
+        self.pool = pool if pool is not None else shared_pool(local=None)
+
+    @contextmanager
+    def session(self, params):
+        connection = CachedConnection(self.cache, params, self.pool)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+
+def add_arguments(parser):
+    parser.add_argument("--no-cache", action="store_true", help="always ask the devices, skip the output cache")
+
+
+def from_args(args, pool=None):
+    return pool if args.no_cache else CachedPool(pool=pool)
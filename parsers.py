@@ -0,0 +1,227 @@
+import re
+import importlib
+from collections import namedtuple
+from functools import lru_cache
+
+import facts
+import mac_table
+
+"""
+Parser registry, one compiled parser per (platform, command)
+
+Regex patterns are compiled once when this module is imported, so the collectors get typed
+records straight from the raw output instead of TextFSM on every call plus regex over str() of it.
+"""
+
+Vlan = namedtuple("Vlan", ["vlan_id", "name", "status", "interfaces"])
+
+PARSERS = {}
+
+
+def register(platform, command):
+    def decorator(function):
+        PARSERS[(platform, command)] = function
+        return function
+    return decorator
+
+
+def parse(platform, command, output):
+    try:
+        parser = PARSERS[(platform, command)]
+    except KeyError:
+        raise ValueError(f"No parser for '{command}' on {platform}") from None
+    return parser(output)
+
+
+"""
+show vlan - same layout on IOS and NX-OS
+"""
+VLAN_STATUSES = ("active", "suspended", "suspend", "act/lshut", "sus/lshut", "act/ishut", "sus/ishut", "act/unsup")
+
+# Names can have spaces on NX-OS, so the line is anchored on the status column like the interface
+# status lines. The name is greedy: a status word inside the name is taken as part of it.
+vlan_line = re.compile(
+    r"^(?P<vlan_id>\d+)\s+(?P<name>.*\S)\s+(?<!\S)(?P<status>"
+    + "|".join(re.escape(status) for status in VLAN_STATUSES)
+    + r")(?:\s+(?P<ports>.*?))?\s*$"
+)
+vlan_ports_line = re.compile(r"^\s{8,}(?P<ports>\S.*)$")
+
+
+def parse_show_vlan(output):
+    vlans = []
+    current = None
+    for line in output.splitlines():
+        if not line.strip():
+            # First section is over, the next ones (VLAN Type, Remote SPAN...) are not used
+            if vlans:
+                break
+            continue
+        match = vlan_line.match(line)
+        if match:
+            current = [int(match.group("vlan_id")), match.group("name"), match.group("status"), []]
+            vlans.append(current)
+            ports = match.group("ports") or ""
+        else:
+            match = vlan_ports_line.match(line)
+            if not match or current is None:
+                continue
+            ports = match.group("ports")
+        current[3].extend(port.strip() for port in ports.split(",") if port.strip())
+    return [Vlan(vlan_id, name, status, tuple(ports)) for vlan_id, name, status, ports in vlans]
+
+
+register("IOS", "show vlan")(parse_show_vlan)
+register("NX-OS", "show vlan")(parse_show_vlan)
+
+
+"""
+show vlan - DellOS9
+
+    NUM    Status    Description                     Q Ports
+*   1      Inactive
+    2431   Active    Servers                         T Po1(Te 1/49-1/50)
+                                                     U Te 1/1-1/4,1/6
+
+The description (the name) is optional and can have spaces, the ports come after the tagging code
+(Q) and stay as the device writes the groups. A VLAN without description has no name.
+"""
+dell_vlan_line = re.compile(
+    r"^[*\sGRPCIOVx]*?(?P<vlan_id>\d+)\s+(?P<status>Active|Inactive|Suspended)\b\s*(?P<rest>.*)$"
+)
+dell_vlan_rest = re.compile(r"^(?P<name>.*?)\s*(?:(?<!\S)[TUxXHMGi]\s+(?P<ports>[A-Za-z]+ ?\d.*))?$")
+dell_vlan_ports_line = re.compile(r"^\s{8,}[TUxXHMGi]\s+(?P<ports>\S.*)$")
+dell_port_group = re.compile(r"[A-Za-z]+ ?[\d/,-]+(?:\([^)]*\))?")
+
+
+@register("DellOS9", "show vlan")
+def parse_show_vlan_dellos9(output):
+    vlans = []
+    current = None
+    for line in output.splitlines():
+        match = dell_vlan_line.match(line)
+        if match:
+            rest = dell_vlan_rest.match(match.group("rest"))
+            current = [int(match.group("vlan_id")), rest.group("name") or None, match.group("status").lower(), []]
+            vlans.append(current)
+            ports = rest.group("ports") or ""
+        else:
+            match = dell_vlan_ports_line.match(line)
+            if not match or current is None:
+                continue
+            ports = match.group("ports")
+        current[3].extend(group.rstrip(",") for group in dell_port_group.findall(ports))
+    return [Vlan(vlan_id, name, status, tuple(ports)) for vlan_id, name, status, ports in vlans]
+
+
+"""
+show version and hostname
+"""
+for _platform in ("IOS", "NX-OS", "DellOS9"):
+    register(_platform, "show version")(facts.parse_show_version)
+
+hostname_line = re.compile(r"^hostname (\S+)", re.M)
+
+
+@register("IOS", "show run")
+def parse_hostname(output):
+    match = hostname_line.search(output)
+    return match.group(1) if match else None
+
+
+"""
+MAC address table
+"""
+for _platform, _command in mac_table.MAC_TABLE_COMMANDS.items():
+    register(_platform, _command)(lambda output, platform=_platform: list(mac_table.parse_mac_table(output, platform)))
+
+
+"""
+Spanning-tree BPDU counters - (port, vlan, received, edge)
+"""
+Bpdu = namedtuple("Bpdu", ["port", "vlan", "received", "edge"], defaults=(False,))
+
+# "show spanning-tree detail" filtered to the port lines, the portfast (IOS) / port type edge (NX-OS)
+# lines and the BPDU counters of each port
+bpdu_port_line = re.compile(r"Port \d+ \((?P<port>\S+)\) of (?P<vlan>\S+)")
+bpdu_counters_line = re.compile(r"BPDU: sent \d+, received (?P<received>\d+)")
+bpdu_edge_line = re.compile(r"portfast|port type is edge", re.I)
+
+
+def parse_bpdu_edge(output):
+    records = []
+    current = None
+    for line in output.splitlines():
+        match = bpdu_port_line.search(line)
+        if match:
+            current = [match.group("port"), match.group("vlan"), False]
+            continue
+        if current is None:
+            continue
+        if bpdu_edge_line.search(line):
+            current[2] = True
+            continue
+        match = bpdu_counters_line.search(line)
+        if match:
+            records.append(Bpdu(current[0], current[1], int(match.group("received")), current[2]))
+            current = None
+    return records
+
+
+for _platform in ("IOS", "NX-OS"):
+    register(_platform, "show spanning-tree detail | inc Eth|BPDU|portfast|edge")(parse_bpdu_edge)
+
+
+"""
+Genie parsers, loaded on demand
+
+Importing genie.libs.parser as a whole costs seconds and hundreds of MB per process, so only the
+parser class of each (platform, command) used is imported, once per process. preload() warms the
+cache up front for long-lived workers and genie_parse() can fall back to the regex parsers above.
+"""
+
+# Platform name used by the scripts -> genie os
+GENIE_OS = {"IOS": "ios", "NX-OS": "nxos"}
+
+# Parser classes already known, anything else is looked up on the genie parser index
+GENIE_PARSERS = {
+    ("IOS", "show version"): "genie.libs.parser.ios.show_platform:ShowVersion",
+    ("NX-OS", "show version"): "genie.libs.parser.nxos.show_platform:ShowVersion",
+    ("IOS", "show vlan"): "genie.libs.parser.ios.show_vlan:ShowVlan",
+    ("NX-OS", "show vlan"): "genie.libs.parser.nxos.show_vlan:ShowVlan",
+}
+
+
+class OfflineDevice:
+    """
+    Genie parsers only need os/custom from the device when the output is given to parse()
+    """
+    def __init__(self, platform):
+        self.os = GENIE_OS.get(platform, platform.lower())
+        self.custom = {}
+
+
+@lru_cache(maxsize=None)
+def genie_parser(platform, command):
+    path = GENIE_PARSERS.get((platform, command))
+    if path:
+        module, name = path.split(":")
+        return getattr(importlib.import_module(module), name), {}
+    from genie.libs.parser.utils.common import get_parser
+
+    return get_parser(command, OfflineDevice(platform))
+
+
+def preload(pairs=GENIE_PARSERS):
+    for platform, command in pairs:
+        genie_parser(platform, command)
+
+
+def genie_parse(platform, command, output, prefer_regex=False):
+    """
+    Structured output like send_command(use_genie=True), without the whole genie import
+    """
+    if prefer_regex and (platform, command) in PARSERS:
+        return parse(platform, command, output)
+    parser_class, kwargs = genie_parser(platform, command)
+    return parser_class(device=OfflineDevice(platform)).parse(output=output, **kwargs)
@@ -0,0 +1,96 @@
+import re
+from interfaces import short_name, parse_status
+
+"""
+Remediation planner used by switch_hardening.py and get_err_disbled_intface.py
+
+Instead of one send_config_set + one "show interface X status" per port, all matched interfaces
+of a device are grouped in interface ranges and pushed in a single config block, then every port
+is checked with a single "show interface status".
+"""
+
+# Max number of comma separated ranges the platform accepts in one "interface range" line
+RANGES_PER_LINE = {"IOS": 5, "NX-OS": 32}
+
+port_pattern = re.compile(r"^(?P<prefix>[A-Za-z-]+)(?P<slot>(?:\d+/)*)(?P<port>\d+)$")
+
+
+def interface_ranges(interfaces):
+    """
+    Group interfaces as ["Gi1/0/1 - 3", "Gi1/0/7"], keeping the order the ports were found
+    """
+    groups = []
+    for interface in interfaces:
+        match = port_pattern.match(interface)
+        if not match:
+            groups.append([interface, None, None, None])
+            continue
+        base = match.group("prefix") + match.group("slot")
+        port = int(match.group("port"))
+        last = groups[-1] if groups else None
+        if last and last[1] == base and last[3] == port - 1:
+            last[3] = port
+        else:
+            groups.append([interface, base, port, port])
+
+    ranges = []
+    for interface, base, first, last in groups:
+        if base is None or first == last:
+            ranges.append(interface)
+        else:
+            ranges.append(f"{base}{first} - {last}")
+    return ranges
+
+
+def build_config(platform, interfaces, commands):
+    """
+    One config block for the whole device. Platforms without range support get one stanza per port.
+    """
+    interfaces = list(dict.fromkeys(short_name(i) for i in interfaces))
+    per_line = RANGES_PER_LINE.get(platform)
+    config = []
+    if per_line is None:
+        for interface in interfaces:
+            config.append(f"interface {interface}")
+            config.extend(commands)
+        return config
+
+    ranges = interface_ranges(interfaces)
+    for start in range(0, len(ranges), per_line):
+        chunk = ranges[start:start + per_line]
+        if platform == "NX-OS":
+            config.append("interface " + ", ".join(r.replace(" - ", "-") for r in chunk))
+        else:
+            config.append("interface range " + ", ".join(chunk))
+        config.extend(commands)
+    return config
+
+
+def remediate(net_connect, platform, interfaces, commands):
+    """
+    Push commands to all interfaces in one send_config_set and verify them with one show command.
+    Return (config output, {port: status after the change}).
+    """
+    return apply_plan(net_connect, platform, {tuple(commands): list(interfaces)})
+
+
+def apply_plan(net_connect, platform, plan):
+    """
+    Same as remediate, with different commands per group of interfaces ({(commands...): [interfaces]}),
+    still one send_config_set for the whole device. An empty plan sends nothing.
+    """
+    plan = {commands: interfaces for commands, interfaces in plan.items() if interfaces}
+    if not plan:
+        return "", {}
+    config_set = []
+    for commands, interfaces in plan.items():
+        config_set.extend(build_config(platform, interfaces, list(commands)))
+    config = net_connect.send_config_set(config_set)
+
+    status = parse_status(net_connect.send_command("show interface status"), platform)
+    verified = {}
+    for interfaces in plan.values():
+        for interface in interfaces:
+            port = status.get(short_name(interface))
+            verified[interface] = port.status if port else "unknown"
+    return config, verified
@@ -0,0 +1,192 @@
+from netmiko import ConnectHandler
+from contextlib import contextmanager
+import threading
+import gzip
+import json
+import os
+
+"""
+Record / replay / dry-run transports, used as pool= on fleet.run_fleet
+
+RecordingPool  - real SSH sessions, every send_command/send_config_set is saved on <dir>/<host>.json.gz
+ReplayPool     - no SSH at all, the outputs come from the fixture files (memory speed), so the
+                 hardening logic can run offline over thousands of synthetic devices
+DryRunPool     - real SSH sessions for the show commands, but config is never sent
+
+All of them keep the config each device would receive on .pushed, the "what would be shut" preview.
+"""
+
+
+class ReplayError(Exception):
+    pass
+
+
+def fixture_path(directory, host):
+    return os.path.join(directory, f"{host}.json.gz")
+
+
+def load_fixture(directory, host):
+    with gzip.open(fixture_path(directory, host), "rt") as f:
+        return json.load(f)
+
+
+def save_fixture(directory, host, fixture):
+    os.makedirs(directory, exist_ok=True)
+    with gzip.open(fixture_path(directory, host), "wt") as f:
+        json.dump(fixture, f)
+
+
+class RecordingConnection:
+    def __init__(self, connection, fixture, pushed):
+        self.connection = connection
+        self.fixture = fixture
+        self.pushed = pushed
+
+    def send_command(self, command, **kwargs):
+        output = self.connection.send_command(command, **kwargs)
+        self.fixture["commands"][command] = output
+        return output
+
+    def send_config_set(self, config_commands, **kwargs):
+        output = self.connection.send_config_set(config_commands, **kwargs)
+        self.fixture["config"].append({"commands": list(config_commands), "output": output})
+        self.pushed.extend(config_commands)
+        return output
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+
+class ReplayConnection:
+    def __init__(self, fixture, pushed):
+        self.fixture = fixture
+        self.pushed = pushed
+        self.prompt = fixture.get("prompt", "switch#")
+
+    def send_command(self, command, **kwargs):
+        try:
+            return self.fixture["commands"][command]
+        except KeyError:
+            raise ReplayError(f"'{command}' not recorded for {self.fixture['host']}") from None
+
+    def send_config_set(self, config_commands, **kwargs):
+        self.pushed.extend(config_commands)
+        return "\n".join(["configure terminal", *config_commands, "end"])
+
+    def find_prompt(self):
+        return self.prompt
+
+    def is_alive(self):
+        return True
+
+    def disconnect(self):
+        pass
+
+
+class DryRunConnection(RecordingConnection):
+    def send_config_set(self, config_commands, **kwargs):
+        self.pushed.extend(config_commands)
+        return "\n".join(["(dry-run) configure terminal", *config_commands, "end"])
+
+
+class _PreviewPool:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pushed = {}
+
+    def _pushed_for(self, host):
+        with self.lock:
+            return self.pushed.setdefault(host, [])
+
+    def preview(self):
+        for host, config in sorted(self.pushed.items()):
+            if config:
+                print(f"\n{host}:")
+                print("\n".join(f"  {line}" for line in config))
+
+
+class RecordingPool(_PreviewPool):
+    def __init__(self, directory):
+        super().__init__()
+        self.directory = directory
+
+    @contextmanager
+    def session(self, params):
+        host = params["host"]
+        connection = ConnectHandler(**params)
+        fixture = {
+            "host": host,
+            "device_type": params.get("device_type"),
+            "prompt": connection.find_prompt(),
+            "commands": {},
+            "config": [],
+        }
+        try:
+            yield RecordingConnection(connection, fixture, self._pushed_for(host))
+        finally:
+            connection.disconnect()
+            save_fixture(self.directory, host, fixture)
+
+
+class ReplayPool(_PreviewPool):
+    """
+    default is the fixture used by hosts without their own file, handy for synthetic fleets
+    """
+    def __init__(self, directory, default=None):
+        super().__init__()
+        self.directory = directory
+        self.default = default
+        self.fixtures = {}
+
+    def fixture(self, host):
+        with self.lock:
+            if host not in self.fixtures:
+                if os.path.exists(fixture_path(self.directory, host)):
+                    self.fixtures[host] = load_fixture(self.directory, host)
+                elif self.default is not None:
+                    self.fixtures[host] = self.fixture_of_default()
+                else:
+                    raise ReplayError(f"No fixture for {host} on {self.directory}")
+            return self.fixtures[host]
+
+    def fixture_of_default(self):
+        if self.default not in self.fixtures:
+            self.fixtures[self.default] = load_fixture(self.directory, self.default)
+        return self.fixtures[self.default]
+
+    @contextmanager
+    def session(self, params):
+        host = params["host"]
+        yield ReplayConnection(self.fixture(host), self._pushed_for(host))
+
+
+class DryRunPool(_PreviewPool):
+    @contextmanager
+    def session(self, params):
+        host = params["host"]
+        connection = ConnectHandler(**params)
+        fixture = {"host": host, "commands": {}, "config": []}
+        try:
+            yield DryRunConnection(connection, fixture, self._pushed_for(host))
+        finally:
+            connection.disconnect()
+
+
+def transport_pool(args):
+    """
+    Pool from the --record/--replay/--dry-run command line options, None means plain SSH
+    """
+    if args.replay:
+        return ReplayPool(args.replay, default=args.replay_default)
+    if args.record:
+        return RecordingPool(args.record)
+    if args.dry_run:
+        return DryRunPool()
+    return None
+
+
+def add_arguments(parser):
+    parser.add_argument("--record", metavar="DIR", help="save every command output on DIR")
+    parser.add_argument("--replay", metavar="DIR", help="run offline with the outputs saved on DIR")
+    parser.add_argument("--replay-default", metavar="HOST", help="fixture used by hosts without one")
+    parser.add_argument("--dry-run", action="store_true", help="show the config without sending it")
@@ -0,0 +1,299 @@
+from netmiko import ConnectHandler
+from netmiko.exceptions import NetmikoTimeoutException, AuthenticationException, SSHException, ReadTimeout
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+from contextlib import contextmanager
+import hashlib
+import tempfile
+import threading
+import logging
+import atexit
+import json
+import time
+import os
+
+logger = logging.getLogger("session_pool")
+
+"""
+Pool of SSH sessions shared by the scripts
+
+Sessions are kept by (host, device_type, username, password) so the next command to the same switch
+reuses a warm channel instead of a new SSH handshake. Idle sessions are checked with is_alive() and
+closed after IDLE_TIMEOUT, and each device never has more than MAX_PER_DEVICE sessions open.
+
+serve() runs the same pool as a local daemon, so separate script runs can share the sessions too
+through RemoteSession. The daemon listens on a unix socket only its user can open, asks for
+SESSION_BROKER_AUTHKEY (it does not start without it) and takes JSON requests with the hostname
+only, the credentials never leave the daemon (a digest of them is checked so a client asking with other
+credentials is refused instead of using the daemon ones). Errors come back with the exception type, so
+a timeout or an authentication failure on the daemon side is the same exception on the client.
+
+Without a pool, fleet.run_fleet and async_collect.collect use the daemon when it is running.
+"""
+
+MAX_PER_DEVICE = 2
+IDLE_TIMEOUT = 300
+KEEPALIVE_INTERVAL = 30
+
+BROKER_ADDRESS = os.path.join(os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir(),
+                              f"session_broker_{os.getuid()}.sock")
+BROKER_AUTHKEY = os.environ.get("SESSION_BROKER_AUTHKEY", "").encode() or None
+BROKER_METHODS = ("send_command", "send_config_set", "find_prompt")
+# Raised again as the same type on the client, anything else comes back as RuntimeError
+BROKER_ERRORS = {
+    error.__name__: error
+    for error in (NetmikoTimeoutException, AuthenticationException, SSHException, ReadTimeout, EOFError, TimeoutError,
+                  ValueError)
+}
+
+
+def session_key(params):
+    password = hashlib.sha256(str(params.get("password", "")).encode()).hexdigest()
+    return (params["host"], params.get("device_type"), params.get("username"), password)
+
+
+def credentials_digest(params):
+    return hashlib.sha256(f"{params.get('username')}\0{params.get('password')}".encode()).hexdigest()
+
+
+class SessionPool:
+    def __init__(self, max_per_device=MAX_PER_DEVICE, idle_timeout=IDLE_TIMEOUT, keepalive_interval=KEEPALIVE_INTERVAL):
+        self.max_per_device = max_per_device
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.condition = threading.Condition()
+        # key -> list of (connection, last used) not in use
+        self.idle = {}
+        # key -> number of sessions open (idle + in use)
+        self.opened = {}
+        self.closed = False
+        # Started on the first session, importing the module does not start threads
+        self.keepalive = None
+
+    def acquire(self, params):
+        key = session_key(params)
+        with self.condition:
+            if self.keepalive is None:
+                self.keepalive = threading.Thread(target=self._keepalive_loop, daemon=True)
+                self.keepalive.start()
+            while True:
+                if self.closed:
+                    raise RuntimeError("Session pool is closed")
+                if self.idle.get(key):
+                    connection, _ = self.idle[key].pop()
+                    break
+                if self.opened.get(key, 0) < self.max_per_device:
+                    self.opened[key] = self.opened.get(key, 0) + 1
+                    connection = None
+                    break
+                self.condition.wait()
+
+        if connection is not None:
+            if self._healthy(connection):
+                return connection
+            self._close(connection)
+        try:
+            return ConnectHandler(**params)
+        except Exception:
+            self._forget(key)
+            raise
+
+    def release(self, params, connection, broken=False):
+        key = session_key(params)
+        if broken or self.closed or not self._healthy(connection):
+            self._close(connection)
+            self._forget(key)
+            return
+        with self.condition:
+            self.idle.setdefault(key, []).append((connection, time.monotonic()))
+            self.condition.notify()
+
+    @contextmanager
+    def session(self, params):
+        connection = self.acquire(params)
+        try:
+            yield connection
+        except BaseException:
+            # A timeout or an error halfway through a command leaves the channel with unread output,
+            # the next user would read it as its own
+            self.release(params, connection, broken=True)
+            raise
+        else:
+            self.release(params, connection)
+
+    def close_all(self):
+        with self.condition:
+            self.closed = True
+            sessions = [connection for idle in self.idle.values() for connection, _ in idle]
+            self.idle.clear()
+            self.condition.notify_all()
+        for connection in sessions:
+            self._close(connection)
+
+    def _forget(self, key):
+        with self.condition:
+            self.opened[key] = max(self.opened.get(key, 1) - 1, 0)
+            self.condition.notify()
+
+    def _healthy(self, connection):
+        try:
+            return connection.is_alive()
+        except Exception:
+            return False
+
+    def _close(self, connection):
+        try:
+            connection.disconnect()
+        except Exception:
+            logger.debug("disconnect failed", exc_info=True)
+
+    def _keepalive_loop(self):
+        while not self.closed:
+            time.sleep(self.keepalive_interval)
+            now = time.monotonic()
+            with self.condition:
+                checks = []
+                for key, idle in self.idle.items():
+                    for connection, last_used in idle:
+                        checks.append((key, connection, now - last_used > self.idle_timeout))
+                    idle.clear()
+
+            for key, connection, expired in checks:
+                # is_alive() sends a null char, that keeps the channel open on the switch side too
+                if expired or not self._healthy(connection):
+                    logger.debug("closing idle session to %s", key[0])
+                    self._close(connection)
+                    self._forget(key)
+                else:
+                    with self.condition:
+                        self.idle.setdefault(key, []).append((connection, now))
+                        self.condition.notify()
+
+
+# Shared by all the scripts running in the same process
+pool = SessionPool()
+atexit.register(pool.close_all)
+
+
+"""
+Local daemon - one pool for all the script runs on this machine
+"""
+
+
+def _serve_client(conn, connection_params):
+    # JSON, not pickle: nothing a client sends is ever executed
+    with conn:
+        while True:
+            try:
+                request = json.loads(conn.recv_bytes())
+            except EOFError:
+                return
+            try:
+                method = request["method"]
+                if method not in BROKER_METHODS:
+                    raise ValueError(f"Method not allowed: {method}")
+                # Credentials come from the daemon side, the client only names the device
+                params = connection_params(str(request["host"]))
+                if request.get("credentials") != credentials_digest(params):
+                    raise AuthenticationException("not the credentials of the session broker")
+                with pool.session(params) as connection:
+                    value = getattr(connection, method)(*request.get("args", []), **request.get("kwargs", {}))
+                reply = {"ok": True, "value": value}
+            except Exception as error:
+                reply = {"ok": False, "error": type(error).__name__, "value": str(error)}
+            conn.send_bytes(json.dumps(reply).encode())
+
+
+def serve(address=BROKER_ADDRESS, authkey=BROKER_AUTHKEY, connection_params=None):
+    if not authkey:
+        raise SystemExit("SESSION_BROKER_AUTHKEY is not set, the session broker does not start without it")
+    if connection_params is None:
+        import net_conn
+        from facts import cached_device_type
+
+        connection_params = cached_device_type(net_conn.netmiko_lab)
+    if os.path.exists(address):
+        os.unlink(address)
+    # Socket created 0600, only this user can connect
+    umask = os.umask(0o177)
+    try:
+        listener = Listener(address, family="AF_UNIX", authkey=authkey)
+    finally:
+        os.umask(umask)
+    with listener:
+        print(f"Session broker listening on {address}")
+        while True:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, OSError):
+                logger.warning("session broker client refused", exc_info=True)
+                continue
+            threading.Thread(target=_serve_client, args=(conn, connection_params), daemon=True).start()
+
+
+class RemoteSession:
+    """
+    Same send_command/send_config_set as netmiko, executed by the daemon on a pooled session
+    """
+    def __init__(self, params, address=BROKER_ADDRESS, authkey=BROKER_AUTHKEY):
+        self.host = params["host"]
+        self.credentials = credentials_digest(params)
+        self.conn = Client(address, family="AF_UNIX", authkey=authkey)
+
+    def _call(self, method, *args, **kwargs):
+        self.conn.send_bytes(json.dumps({"host": self.host, "credentials": self.credentials, "method": method,
+                                         "args": args, "kwargs": kwargs}).encode())
+        reply = json.loads(self.conn.recv_bytes())
+        if not reply["ok"]:
+            error = BROKER_ERRORS.get(reply.get("error"))
+            if error is None:
+                raise RuntimeError(f"{reply.get('error')}: {reply['value']}")
+            raise error(reply["value"])
+        return reply["value"]
+
+    def send_command(self, *args, **kwargs):
+        return self._call("send_command", *args, **kwargs)
+
+    def send_config_set(self, *args, **kwargs):
+        return self._call("send_config_set", *args, **kwargs)
+
+    def find_prompt(self):
+        return self._call("find_prompt")
+
+    def disconnect(self):
+        self.conn.close()
+
+
+class BrokerPool:
+    """
+    Same session() as SessionPool, so fleet.run_fleet(pool=...) can use the daemon
+    """
+    def __init__(self, address=BROKER_ADDRESS, authkey=BROKER_AUTHKEY):
+        self.address = address
+        self.authkey = authkey
+
+    @contextmanager
+    def session(self, params):
+        remote = RemoteSession(params, self.address, self.authkey)
+        try:
+            yield remote
+        finally:
+            remote.disconnect()
+
+
+def shared_pool(address=BROKER_ADDRESS, authkey=BROKER_AUTHKEY, local=pool):
+    """
+    The daemon when it is running (and SESSION_BROKER_AUTHKEY is set), otherwise local (the pool of this
+    process, None for new sessions)
+    """
+    if not authkey or not os.path.exists(address):
+        return local
+    try:
+        Client(address, family="AF_UNIX", authkey=authkey).close()
+    except (OSError, EOFError, AuthenticationError):
+        return local
+    return BrokerPool(address, authkey)
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,200 @@
+import csv
+import json
+import logging
+import sqlite3
+
+logger = logging.getLogger("sinks")
+
+"""
+Result sinks for the collectors
+
+Collectors yield records (dicts or namedtuples) one by one and a sink writes them as they come,
+so memory stays the same no matter how many devices the run has. Every sink works as a context
+manager with write(record):
+
+    with open_sink("mac_table.jsonl") as sink:
+        for record in records:
+            sink.write(record)
+
+The sink is picked from the file extension: .jsonl, .csv, .sqlite/.db or .parquet (needs pyarrow).
+"""
+
+
+def as_dict(record):
+    if hasattr(record, "_asdict"):
+        return record._asdict()
+    return dict(record)
+
+
+class JsonLinesSink:
+    def __init__(self, filename):
+        self.file = open(filename, "a")
+
+    def write(self, record):
+        self.file.write(json.dumps(as_dict(record), default=str) + "\n")
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvSink(JsonLinesSink):
+    """
+    Columns come from the first record
+    """
+    def __init__(self, filename):
+        self.file = open(filename, "a", newline="")
+        self.writer = None
+
+    def write(self, record):
+        row = as_dict(record)
+        if self.writer is None:
+            self.writer = csv.DictWriter(self.file, fieldnames=list(row), extrasaction="ignore")
+            if self.file.tell() == 0:
+                self.writer.writeheader()
+        self.writer.writerow({key: value if not isinstance(value, (list, tuple)) else ",".join(map(str, value))
+                              for key, value in row.items()})
+
+
+class SqliteSink(JsonLinesSink):
+    """
+    One table, created from the first record, commits every BATCH rows
+    """
+    BATCH = 1000
+
+    def __init__(self, filename, table="records"):
+        self.db = sqlite3.connect(filename)
+        self.table = table
+        self.columns = None
+        self.pending = []
+
+    def write(self, record):
+        row = as_dict(record)
+        if self.columns is None:
+            self.columns = list(row)
+            columns = ", ".join(f'"{column}"' for column in self.columns)
+            self.db.execute(f'CREATE TABLE IF NOT EXISTS "{self.table}" ({columns})')
+        self.pending.append(tuple(json.dumps(value) if isinstance(value, (list, tuple, dict)) else value
+                                  for value in (row.get(column) for column in self.columns)))
+        if len(self.pending) >= self.BATCH:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            placeholders = ", ".join("?" * len(self.columns))
+            with self.db:
+                self.db.executemany(f'INSERT INTO "{self.table}" VALUES ({placeholders})', self.pending)
+            self.pending = []
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+
+class ParquetSink(JsonLinesSink):
+    """
+    Row groups of BATCH records, pyarrow is only imported when this sink is used.
+
+    The schema comes from the first batch (columns with only None there are strings) and every
+    batch is written with it: missing columns are null, new keys are left out and a value of
+    another type is converted to the column type (to str on string columns, null when it cannot be).
+    """
+    BATCH = 10000
+
+    def __init__(self, filename):
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pyarrow = pyarrow
+        self.filename = filename
+        self.schema = None
+        self.writer = None
+        self.pending = []
+
+    def write(self, record):
+        self.pending.append(as_dict(record))
+        if len(self.pending) >= self.BATCH:
+            self.flush()
+
+    def _column(self, field, values):
+        pyarrow = self.pyarrow
+        try:
+            return pyarrow.array(values, type=field.type)
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+            pass
+        converted = []
+        for value in values:
+            if value is not None and pyarrow.types.is_string(field.type):
+                value = str(value)
+            try:
+                pyarrow.array([value], type=field.type)
+            except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+                logger.warning("%s: %r is not %s, written as null", field.name, value, field.type)
+                value = None
+            converted.append(value)
+        return pyarrow.array(converted, type=field.type)
+
+    def flush(self):
+        if not self.pending:
+            return
+        pyarrow = self.pyarrow
+        if self.schema is None:
+            inferred = pyarrow.Table.from_pylist(self.pending).schema
+            self.schema = pyarrow.schema([
+                field.with_type(pyarrow.string()) if pyarrow.types.is_null(field.type) else field for field in inferred
+            ])
+            self.writer = pyarrow.parquet.ParquetWriter(self.filename, self.schema)
+        columns = [self._column(field, [row.get(field.name) for row in self.pending]) for field in self.schema]
+        self.writer.write_table(pyarrow.Table.from_arrays(columns, schema=self.schema))
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+
+
+class ConsoleSink(JsonLinesSink):
+    def __init__(self, filename=None):
+        pass
+
+    def write(self, record):
+        print(as_dict(record))
+
+    def close(self):
+        pass
+
+
+SINKS = {
+    ".jsonl": JsonLinesSink,
+    ".csv": CsvSink,
+    ".sqlite": SqliteSink,
+    ".db": SqliteSink,
+    ".parquet": ParquetSink,
+}
+
+
+def open_sink(filename=None):
+    if not filename:
+        return ConsoleSink()
+    for extension, sink in SINKS.items():
+        if filename.endswith(extension):
+            return sink(filename)
+    raise ValueError(f"Unknown sink for {filename}, use one of {', '.join(SINKS)}")
+
+
+def drain(records, filename=None):
+    """
+    Write every record of a generator to the sink of filename, return how many were written
+    """
+    count = 0
+    with open_sink(filename) as sink:
+        for record in records:
+            sink.write(record)
+            count += 1
+    return count
@@ -1,114 +1,115 @@
-from netmiko import ConnectHandler
-from netmiko.exceptions import NetmikoTimeoutException
-from netmiko.exceptions import AuthenticationException
-from netmiko.exceptions import SSHException
-import re
+import argparse
 import net_conn
-import auth
+import inventory
 import logging
+from log_setup import setup_logging
 from colorama import Fore
+from fleet import run_fleet, UnsupportedPlatform
+from remediation import apply_plan
+from interfaces import with_status
+from desired_state import plan_device, HARDENING_POLICY
+import facts
+import metrics
+import timing
+import replay
+import journal
+from facts import device_facts, cached_device_type
 
 # To show logging and troubleshooting in case of problems
-logging.basicConfig(filename="netmiko_global.log", level=logging.DEBUG)
+setup_logging(transcripts="transcripts")
 logger = logging.getLogger("netmiko")
 
 """
-The main proposal here is to identify all interfaces on environment without that not using 
+The main proposal here is to identify all interfaces on environment without that not using
 and disable to avoid man-in-the-middle.
 
-I'm using Netbox as Source of Truth to connect in devices. Function net_conn imported to use Netmiko 
-and function auth to pass all the parameters to authenticate 
+I'm using Netbox as Source of Truth to connect in devices. Function net_conn imported to use Netmiko
+and function auth to pass all the parameters to authenticate
 """
-# nb_api = list(auth.nb.dcim.devices.filter("mgmt", model="9200"))
-with open("hosts", "r") as f:
-    nb_api = f.read().splitlines()
+# Status of the interfaces to work on, per platform
+UNUSED_STATUS = {"IOS": "disabled", "NX-OS": "xcvrAbsen"}
 
+JOURNAL_FILE = "switch_hardening_journal.jsonl"
 
-"""
-Loop devices find on Netbox
-"""
-for ip in nb_api:
-    ipadd = str(ip)
-    ios = net_conn.netmiko_ios(ipadd)
-    print(Fore.BLUE + f"Connecting to the device: {ipadd}" + Fore.RESET)
 
+def harden(net_connect, device):
     """
-    Handle device not reachable exceptions in Netmiko
+    Device Hardening - Put all interfaces match with "notconnect (IOS) or xcvrAbsent (NXOS)" and put description LIVRE
     """
-    try:
-        net_connect = ConnectHandler(**ios)
-    except NetmikoTimeoutException:
-        print(f"Timeout to device: {ipadd}")
-        continue
-    except AuthenticationException:
-        print(f"Authentication failure: {ipadd}")
-        continue
-    except EOFError:
-        print(f"End of file while attempting device {ipadd}")
-        continue
-    except SSHException:
-        print(f"SSH Issue. Are you sure SSH is enabled? {ipadd}")
-        continue
-    except Exception as unknown_error:
-        print(f"Some other error: {str(unknown_error)}")
-        continue
-
-    # Types of devices
-    list_versions = ["NX-OS", "IOS"]
-
-    # Check software versions
-    for software_ver in list_versions:
-        print("Checking for " + software_ver)
-        output_version = net_connect.send_command("show version")
-        int_version = 0  # Reset integer value
-        int_version = output_version.find(software_ver)  # Check software version
-        if int_version > 0:
-            print(f"Software version found: {software_ver}")
-            break
-        else:
-            print(f"Did not find {software_ver}")
-
-    if software_ver == "NX-OS":
-        print(f"Running {software_ver} commands\n")
-        output = net_connect.send_command("show interface status | in xcvrAbsen")
-    elif software_ver == "IOS":
-        print(f"Running {software_ver} commands\n")
-        output = net_connect.send_command("show interface | in disabled")
-        print(output)
+    # Check software version, "show version" only runs when the device is not in the facts cache
+    software_ver = device_facts(net_connect, str(device))["platform"] or "IOS"
 
-    """
-    Regex pattern from NXOS
-    """
-    # Regex to match with all kinds of interfaces
-    int_pattern = re.compile(r"(?P<interface>\S+[A-Za-z][0-9].[0-9].[0-9]*)")
+    if software_ver not in UNUSED_STATUS:
+        raise UnsupportedPlatform(f"no hardening commands for {software_ver}")
 
-    """
-    Handle exception when does not have a specific match 
-    """
-    try:
-        match = int_pattern.search(output)
-        interface = match.group("interface")
-    except AttributeError:
-        print('No such attribute "notconnect interfaces"')
-        continue
+    # Status column of every port in one pass, only the exact status is kept (not err-disabled)
+    status = UNUSED_STATUS[software_ver]
+    output = net_connect.send_command(f"show interface status | in {status}")
+    all_int = with_status(output, software_ver, status)
+
+    # Only interfaces not hardened yet, compared with the running-config (read once)
+    changes = plan_device(net_connect, software_ver, all_int, HARDENING_POLICY)
+
+    # All interfaces in one config block and one "show interface status" to check them
+    config, hardened = apply_plan(net_connect, software_ver, changes)
+    logger.debug(config)
 
-    # Regex pattern
-    all_int = re.findall(int_pattern, output)
+    return {"platform": software_ver, "interfaces": hardened}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shutdown and set description LIVRE on unused interfaces")
+    replay.add_arguments(parser)
+    inventory.add_arguments(parser)
+    journal.add_arguments(parser)
+    args = parser.parse_args()
+    pool = replay.transport_pool(args)
+    run_journal = None
+    if not (args.replay or args.dry_run):
+        # Progress on the journal, --resume goes on from the devices not done yet
+        try:
+            run_journal = journal.from_args(args, JOURNAL_FILE)
+        except FileExistsError as error:
+            parser.error(str(error))
+
+    # Netbox devices from the inventory cache with --platform/--site/--model/--role, "hosts" file without
+    with metrics.span("netbox"):
+        nb_api = inventory.from_args(args)
+    facts.load_netbox(nb_api)
+    metrics.enable_console()
+
+    print(Fore.BLUE + f"Hardening {len(nb_api)} devices" + Fore.RESET)
+    params = cached_device_type(net_conn.netmiko_ios)
+    if run_journal is None:
+        summary = run_fleet(nb_api, harden, params, pool=pool)
+    else:
+        try:
+            summary = journal.run_resumable(nb_api, harden, params, run_journal, retries=args.retries, pool=pool)
+        finally:
+            run_journal.close()
+    # Facts learned from fixtures are not saved for the real runs
+    if not args.replay:
+        facts.cache.save()
+        timing.profile.save()
 
     """
-    Loop to print all condition interfaces
+    Print all condition interfaces found per device
     """
-    for int in all_int:
-        print(Fore.RED + f"Interface founded: {int}" + Fore.RESET)
-
-        """
-        Device Hardening - Put all interfaces match with "notconnect (IOS) or xcvrAbsent (NXOS)" and put description LIVRE
-        """
-        config = net_connect.send_config_set(
-            [f"interface {int}", "description LIVRE", "shutdown"]
-        )
-        print(config)
-        print(Fore.YELLOW+f"\nInterface Status" + Fore.RESET)
-
-        show_intface = net_connect.send_command(f"show interface {int} status")
-        print(f"{show_intface}\n")
+    for result in summary.ok:
+        print(Fore.BLUE + f"\n{result.host} ({result.data['platform']}) in {result.elapsed:.1f}s" + Fore.RESET)
+        if not result.data["interfaces"]:
+            print('No such attribute "notconnect interfaces"')
+        for int, status in result.data["interfaces"].items():
+            print(Fore.RED + f"Interface founded: {int}" + Fore.RESET)
+            print(f"{status}\n")
+
+    summary.print_report()
+    metrics.write_openmetrics()
+    if pool is not None:
+        print(Fore.YELLOW + "\nConfig pushed (or that would be pushed) per device" + Fore.RESET)
+        pool.preview()
+    return summary
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+import os
+import sys
+import types
+
+# The modules live at the top of the repository, next to the scripts
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import net_conn  # noqa: F401
+except ImportError:
+    # net_conn has the credentials and is not on the repository, the tests never log in to a device
+    net_conn = types.ModuleType("net_conn")
+    net_conn.user_lab = net_conn.pass_lab = net_conn.username = net_conn.passwd = "test"
+
+    def _params(device_type):
+        return lambda host: {"device_type": device_type, "host": host, "username": "test", "password": "test"}
+
+    net_conn.netmiko_lab = net_conn.netmiko_ios = net_conn.netmiko_connection = _params("cisco_ios")
+    net_conn.netmiko_nxos = _params("cisco_nxos")
+    net_conn.netmiko_dellos9 = _params("dell_force10")
+    sys.modules["net_conn"] = net_conn
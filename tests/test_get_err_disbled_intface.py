@@ -0,0 +1,45 @@
+import importlib
+import pytest
+
+pytest.importorskip("netmiko")
+pytest.importorskip("colorama")
+
+STATUS = "\n".join([
+    "Gi1/0/1                      disabled     1            auto   auto 10/100/1000BaseTX",
+    "Gi1/0/2   uplink             err-disabled 1            auto   auto 10/100/1000BaseTX",
+    "Gi1/0/3   not disabled       connected    1          a-full a-1000 10/100/1000BaseTX",
+])
+
+
+class FakeConnection:
+    def __init__(self):
+        self.commands = []
+        self.config = []
+
+    def send_command(self, command, **kwargs):
+        self.commands.append(command)
+        # The sample is not filtered, the script has to pick the ports by their exact status
+        return STATUS
+
+    def send_config_set(self, config_commands, **kwargs):
+        self.config += list(config_commands)
+        return "\n".join(config_commands)
+
+
+@pytest.fixture
+def script(tmp_path, monkeypatch):
+    # The script sets up its log files on import, keep them out of the repository
+    monkeypatch.chdir(tmp_path)
+    module = importlib.import_module("get_err_disbled_intface")
+    monkeypatch.setattr(module, "device_facts", lambda net_connect, host: {"platform": "IOS"})
+    return module
+
+
+def test_recover_selects_only_err_disabled_ports(script):
+    net_connect = FakeConnection()
+    result = script.recover(net_connect, "sw1")
+
+    assert net_connect.commands[0] == "show interface status | in err-disable"
+    assert list(result["interfaces"]) == ["Gi1/0/2"]
+    assert net_connect.config[0] == "interface range Gi1/0/2"
+    assert not any("Gi1/0/1" in line or "Gi1/0/3" in line for line in net_connect.config)
@@ -0,0 +1,44 @@
+from parsers import parse, parse_show_vlan, Vlan
+
+SHOW_VLAN = """
+VLAN Name                             Status    Ports
+---- -------------------------------- --------- -------------------------------
+1    default                          active    Eth1/1, Eth1/2
+2431 Servers active backup            active    Eth1/3, Eth1/4,
+                                                Eth1/5
+2432 VLAN2432                         act/lshut
+2433 Old users                        suspend   Eth1/6
+
+VLAN Type         Vlan-mode
+---- -----        ----------
+1    enet         CE
+"""
+
+
+def test_parse_show_vlan_multi_word_names():
+    assert parse_show_vlan(SHOW_VLAN) == [
+        Vlan(1, "default", "active", ("Eth1/1", "Eth1/2")),
+        Vlan(2431, "Servers active backup", "active", ("Eth1/3", "Eth1/4", "Eth1/5")),
+        Vlan(2432, "VLAN2432", "act/lshut", ()),
+        Vlan(2433, "Old users", "suspend", ("Eth1/6",)),
+    ]
+
+
+DELLOS9_SHOW_VLAN = """
+Codes: * - Default VLAN, G - GVRP VLANs, R - Remote Port Mirroring VLANs, P - Primary, C - Community, I - Isolated
+Q: U - Untagged, T - Tagged
+
+    NUM    Status    Description                     Q Ports
+*   1      Inactive
+    2400   Active    Servers farm A                  T Po1(Te 1/49-1/50)
+                                                     U Te 1/1-1/4,1/6
+    2431   Active                                    T Po1(Te 1/49-1/50)
+"""
+
+
+def test_parse_show_vlan_dellos9():
+    assert parse("DellOS9", "show vlan", DELLOS9_SHOW_VLAN) == [
+        Vlan(1, None, "inactive", ()),
+        Vlan(2400, "Servers farm A", "active", ("Po1(Te 1/49-1/50)", "Te 1/1-1/4,1/6")),
+        Vlan(2431, None, "active", ("Po1(Te 1/49-1/50)",)),
+    ]
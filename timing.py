@@ -0,0 +1,164 @@
+import json
+import os
+import re
+import threading
+import time
+from statistics import median
+from netmiko.exceptions import NetmikoTimeoutException, ReadTimeout
+
+"""
+Timing profile per device, learned from the runs and kept in timing_profile.json
+
+Every command is timed (per host and command without its arguments, config sets per line) and
+the profile keeps a moving average and a decaying peak. The next sessions use them instead of the netmiko defaults:
+
+- read_timeout of each command is a few times its peak, never below netmiko's default, so slow
+  switches stop failing with ReadTimeout. A timeout doubles the next read_timeout, up to
+  MAX_READ_TIMEOUT (below the run_fleet watchdog, so netmiko gives up before it does).
+- global_delay_factor is lowered for fast devices (shorter session preparation) and raised for
+  slow ones, from the typical time they take to answer a command.
+- conn_timeout grows for devices slow to connect.
+
+Prompt matching stays on netmiko's base prompt, that is already exact.
+"""
+
+PROFILE_FILE = "timing_profile.json"
+
+# Weight of the new sample on the moving average, and how fast the peak forgets old samples
+ALPHA = 0.3
+PEAK_DECAY = 0.9
+
+# read_timeout = SAFETY x peak, between the netmiko default and MAX_READ_TIMEOUT
+SAFETY = 3
+DEFAULT_READ_TIMEOUT = 10
+# Below the 300s default timeout of fleet.run_fleet
+MAX_READ_TIMEOUT = 240
+
+# Average command time (seconds) under FAST / over SLOW -> global_delay_factor
+FAST = 0.5
+SLOW = 3.0
+FAST_DELAY_FACTOR = 0.5
+MAX_DELAY_FACTOR = 4
+
+DEFAULT_CONN_TIMEOUT = 10
+MAX_CONN_TIMEOUT = 60
+
+TIMEOUT_ERRORS = (ReadTimeout, NetmikoTimeoutException)
+
+# Interface names, VLAN ids, addresses... every word with a digit is an argument
+ARGUMENT_PATTERN = re.compile(r"(?<!\S)\S*\d\S*")
+
+
+def command_key(command):
+    """
+    "show interface Gi1/0/1 status" -> "show interface * status", one profile entry for all of them
+    """
+    return ARGUMENT_PATTERN.sub("*", command)
+
+
+class TimingProfile:
+    def __init__(self, filename=PROFILE_FILE):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.hosts = {}
+        if os.path.exists(filename):
+            with open(filename, "r") as f:
+                self.hosts = json.load(f)
+
+    def observe(self, host, key, seconds, timed_out=False):
+        with self.lock:
+            stats = self.hosts.setdefault(host, {}).setdefault(key, {"average": seconds, "peak": 0.0, "samples": 0})
+            stats["average"] += ALPHA * (seconds - stats["average"])
+            if timed_out:
+                # The real time is unknown, only that it took longer than the read_timeout given:
+                # the peak is set so the next read_timeout (SAFETY x peak) is twice that one
+                stats["timeouts"] = stats.get("timeouts", 0) + 1
+                seconds = 2 * max(seconds, DEFAULT_READ_TIMEOUT) / SAFETY
+            stats["peak"] = max(seconds, stats["peak"] * PEAK_DECAY)
+            stats["samples"] += 1
+
+    def _stats(self, host, key):
+        with self.lock:
+            return dict(self.hosts.get(host, {}).get(key, {}))
+
+    def read_timeout(self, host, key, lines=1):
+        stats = self._stats(host, key)
+        if not stats:
+            return DEFAULT_READ_TIMEOUT if lines == 1 else max(DEFAULT_READ_TIMEOUT, lines)
+        return min(MAX_READ_TIMEOUT, max(DEFAULT_READ_TIMEOUT, SAFETY * stats["peak"] * lines))
+
+    def delay_factor(self, host):
+        """
+        global_delay_factor from the median of the command averages of the host, None without samples
+        """
+        with self.lock:
+            commands = [stats["average"] for key, stats in self.hosts.get(host, {}).items()
+                        if key not in ("connect", "config")]
+        if not commands:
+            return None
+        average = median(commands)
+        if average < FAST:
+            return FAST_DELAY_FACTOR
+        if average > SLOW:
+            return min(MAX_DELAY_FACTOR, round(average / SLOW, 1))
+        return 1
+
+    def tune(self, params):
+        """
+        Netmiko params with the delay factor and connection timeout of the host, the given ones win
+        """
+        host = params.get("host")
+        tuned = dict(params)
+        delay_factor = self.delay_factor(host)
+        if delay_factor is not None:
+            tuned.setdefault("global_delay_factor", delay_factor)
+        connect = self._stats(host, "connect")
+        if connect:
+            tuned.setdefault("conn_timeout", min(MAX_CONN_TIMEOUT, max(DEFAULT_CONN_TIMEOUT, SAFETY * connect["peak"])))
+        return tuned
+
+    def save(self):
+        with self.lock:
+            data = json.dumps(self.hosts, indent=2)
+        tmp = self.filename + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(data)
+        os.replace(tmp, self.filename)
+
+
+# Shared by all the scripts running in the same process
+profile = TimingProfile()
+
+
+class AdaptiveConnection:
+    """
+    Netmiko connection with the read_timeout of the profile on every command, unless one is given
+    """
+    def __init__(self, connection, host, timing_profile=profile):
+        self.connection = connection
+        self.host = host
+        self.profile = timing_profile
+
+    def _timed(self, method, key, lines, args, kwargs):
+        kwargs.setdefault("read_timeout", self.profile.read_timeout(self.host, key, lines))
+        begin = time.monotonic()
+        try:
+            output = method(*args, **kwargs)
+        except TIMEOUT_ERRORS:
+            self.profile.observe(self.host, key, kwargs["read_timeout"] / lines, timed_out=True)
+            raise
+        self.profile.observe(self.host, key, (time.monotonic() - begin) / lines)
+        return output
+
+    def send_command(self, command_string, *args, **kwargs):
+        return self._timed(self.connection.send_command, command_key(command_string), 1, (command_string, *args),
+                           kwargs)
+
+    def send_config_set(self, config_commands=None, *args, **kwargs):
+        config_commands = list(config_commands or [])
+        # Config sets differ on every device, the profile keeps the time per line
+        lines = max(1, len(config_commands))
+        return self._timed(self.connection.send_config_set, "config", lines, (config_commands, *args), kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
@@ -1,41 +1,66 @@
-from netmiko import ConnectHandler
-import net_conn
-import re
+import os
+import sys
+# The shared modules (drivers, fleet, net_conn...) are one level up, for python tshoot/<script>.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import drivers
 from colorama import Fore
+from async_collect import run, stream
+from sinks import open_sink
+from bpdu_history import BpduHistory, HISTORY_FILE
+import argparse
+import inventory
+import timing
+
+
+driver = drivers.get("IOS")
 
 
 class CiscoDeviceIOS:
 
-    def get_vlans_info(self):
-        with open("hosts", "r") as f:
-            addresses = f.read().splitlines()
+    def bpdu_info(self, ssh_connection, host):
+        return driver.bpdu(ssh_connection)
 
-        for devices in addresses:
-            print(
-                Fore.LIGHTBLACK_EX + f"\nConnecting to device: {devices}\n" + Fore.RESET
-            )
-            device = {
-                "device_type": "cisco_ios",
-                "host": devices,
-                "username": net_conn.user_lab,
-                "password": net_conn.pass_lab,
-                "secret": net_conn.pass_lab,
-            }
+    def print_info(self, result):
+        print(Fore.LIGHTBLACK_EX + f"\nDevice: {result.host}\n" + Fore.RESET)
+        if result.status != "ok":
+            print(Fore.RED + f"{result.status} {result.error}" + Fore.RESET)
+            return
+        print(result.data)
 
-            # Connect to device
-            ssh_connection = ConnectHandler(**device)
+    def record(self, history, result):
+        if result.status != "ok":
+            self.print_info(result)
+            return
+        history.add(result.host, result.data)
 
-            # show_ver_output = ssh_connection.send_command("show run")
-            show_bpdu = ssh_connection.send_command(
-                "show spanning-tree detail | inc Eth|BPDU"
-            )
-            # print(show_bpdu)
+    def print_leaks(self, history):
+        leaks = history.edge_leaks()
+        print(Fore.YELLOW + f"\n{len(history.last_two())} port/vlan counters compared, "
+              f"{len(leaks)} edge ports receiving BPDUs" + Fore.RESET)
+        for leak in leaks:
+            print(Fore.RED + f"{leak.host:<30}{leak.port:<25}{leak.vlan:<12}"
+                  f"+{leak.delta} in {leak.seconds:.0f}s ({leak.per_minute:.1f}/min)" + Fore.RESET)
 
-            bpdu_pattern = r"Port.\w..(\S+[A-Za-z][0-9].[0-9].[0-9]*).of.(\S+).+\s+BPDU:.sent.\w+,.received.(\d+)"
-            bpdu = re.findall(bpdu_pattern, show_bpdu)
+    def get_vlans_info(self, output=None, history_file=HISTORY_FILE):
+        if output:
+            # Records go straight to the file (.jsonl, .csv, .sqlite or .parquet) as each device finishes
+            with open_sink(output) as sink:
+                written = stream(inventory.hosts(), self.bpdu_info, driver.params, sink, on_failure=self.print_info)
+            print(f"{written} records saved on {output}")
+            return
 
-            print(bpdu)
+        # All devices at the same time, the counters go to the history and are compared with the
+        # previous collection (INVENTORY_FILTER on .env picks them from the Netbox inventory instead of "hosts")
+        history = BpduHistory.load(history_file)
+        run(inventory.hosts(), self.bpdu_info, driver.params, lambda result: self.record(history, result))
+        history.save(history_file)
+        self.print_leaks(history)
 
 
+parser = argparse.ArgumentParser()
+parser.add_argument("--output", help="file to save the records instead of printing them")
+parser.add_argument("--history", default=HISTORY_FILE, help="BPDU counters history file")
+args = parser.parse_args()
 sa = CiscoDeviceIOS()
-sa.get_vlans_info()
+sa.get_vlans_info(args.output, args.history)
+timing.profile.save()
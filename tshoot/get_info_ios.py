@@ -1,46 +1,49 @@
-from netmiko import ConnectHandler
-import net_conn
-import re
+import os
+import sys
+# The shared modules (drivers, fleet, net_conn...) are one level up, for python tshoot/<script>.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import drivers
 from colorama import Fore
+from async_collect import run
+import argparse
+import inventory
+import output_cache
+import timing
 
 
-class CiscoDeviceIOS:
-
-    def get_device_info(self):
-        with open("hosts", "r") as f:
-            addresses = f.read().splitlines()
-
-        
-        for devices in addresses:
-            device = {
-                "device_type": "cisco_ios",
-                "host": devices,
-                "username": net_conn.user_lab,
-                "password": net_conn.pass_lab,
-                "secret": net_conn.pass_lab,
-            }
-
-            # Connect to device
-            ssh_connection = ConnectHandler(**device)
-
-            show_ver_output = ssh_connection.find_prompt()
-            show_ver_output = ssh_connection.send_command("show version")
+driver = drivers.get("IOS")
 
-            hostname_pattern = r"(\S+).+uptime.is"
-            hostname = re.findall(hostname_pattern, show_ver_output)
-            print(Fore.YELLOW + f"\nHostname: {hostname}" + Fore.RESET)
-
-            version_pattern = r"Version.(\d+..)"
-            version = re.findall(version_pattern, show_ver_output)
-            print(f"IOS Version: {version}")
-
-            uptime_pattern = r"uptime.is.(\S.+)"
-            uptime = re.findall(uptime_pattern, show_ver_output)
-            print(f"Uptime: {uptime}")
-
-            show_clock = ssh_connection.send_command("show clock")
-            print(f"Hour: {show_clock}")
 
+class CiscoDeviceIOS:
 
-sa = CiscoDeviceIOS()
-sa.get_device_info()
+    def __init__(self, clock=False):
+        # The device clock only with --no-cache, cached runs do not connect for it
+        self.clock = clock
+
+    def device_info(self, ssh_connection, host):
+        return driver.device_info(ssh_connection, clock=self.clock)
+
+    def print_info(self, result):
+        if result.status != "ok":
+            print(Fore.RED + f"\n{result.host}: {result.status} {result.error}" + Fore.RESET)
+            return
+        info = result.data
+        print(Fore.YELLOW + f"\nHostname: {info['hostname']}" + Fore.RESET)
+        print(f"IOS Version: {info['version']}")
+        print(f"Uptime: {info['uptime']}")
+        if info["clock"] is not None:
+            print(f"Hour: {info['clock']}")
+
+    def get_device_info(self, pool=None):
+        # All devices at the same time, each one printed as soon as it answers
+        # (INVENTORY_FILTER on .env picks them from the Netbox inventory instead of "hosts")
+        # "show" outputs still fresh on the output cache do not reach the device (--no-cache to skip it)
+        run(inventory.hosts(), self.device_info, driver.params, self.print_info, pool=pool)
+
+
+parser = argparse.ArgumentParser()
+output_cache.add_arguments(parser)
+args = parser.parse_args()
+sa = CiscoDeviceIOS(clock=args.no_cache)
+sa.get_device_info(output_cache.from_args(args))
+timing.profile.save()
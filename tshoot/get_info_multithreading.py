@@ -1,34 +1,59 @@
 # https://www.consentfactory.com/python-threading-queuing-netmiko/
 
+import os
+import sys
+# The shared modules (drivers, fleet, net_conn...) are one level up, for python tshoot/<script>.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 # Queuing and threading libraries
 from queue import Queue
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 import threading
 
 # Import function with username and password
 from net_conn import user_lab, pass_lab
 
 # Importing Netmiko modules
-from netmiko import ConnectHandler
+from session_pool import shared_pool
 from datetime import datetime
 from colorama import Fore
+import parsers
+import inventory
 
-start_time = datetime.now()
-end_time = datetime.now()
-# Set up thread count for number of threads to spin up
+# Set up thread count for number of threads to spin up (SSH I/O only)
 num_threads = 8
+# Processes parsing the outputs, genie parsing is CPU bound and does not scale with threads
+num_parsers = os.cpu_count() or 2
+# Raw outputs waiting for a parser before the I/O threads stop fetching (backpressure)
+max_pending = num_parsers * 4
 # This sets up the queue
 enclosure_queue = Queue()
 # Set up thread lock so that only one thread prints at a time
 print_lock = threading.Lock()
 
+command = "show version"
 
-with open("hosts") as f:
-    address = f.read().splitlines()
 
-command = "show version"
+def print_result(ip, future, pending):
+    # One more raw output can go to the parsers
+    pending.release()
+    try:
+        show_ver_output = future.result()
+    except Exception as error:
+        show_ver_output = Fore.RED + f"Parser error: {error}" + Fore.RESET
+
+    with print_lock:
+        print("\nPrinting output... {}".format(ip))
+        print(
+            Fore.LIGHTBLACK_EX
+            + f"Connecting to the device {ip} {'#'*10}"
+            + Fore.RESET
+        )
+        print(show_ver_output)
 
 
-def deviceconnector(i, q):
+def deviceconnector(i, q, session_pool, parser_pool, pending):
 
     while True:
 
@@ -45,18 +70,21 @@ def deviceconnector(i, q):
             "device_type": "cisco_ios",
         }
 
-        ssh_connection = ConnectHandler(**device_dict)
-        show_ver_output = ssh_connection.find_prompt()
-        show_ver_output = ssh_connection.send_command(command, use_genie=True)
-
-        with print_lock:
-            print("\n{}: Printing output... {}".format(i, ip))
-            print(
-                Fore.LIGHTBLACK_EX
-                + f"Connecting to the device {ip} {'#'*10}"
-                + Fore.RESET
-            )
-            print(show_ver_output)
+        try:
+            # Warm session from the pool, given back (not leaked) when the command is done
+            with session_pool.session(device_dict) as ssh_connection:
+                show_ver_output = ssh_connection.send_command(command)
+        except Exception as error:
+            with print_lock:
+                print(Fore.RED + f"\n{i}: {ip} failed: {error}" + Fore.RESET)
+            q.task_done()
+            continue
+
+        # Only the raw text goes to the parser processes, this thread goes back to SSH right away
+        # unless max_pending outputs are already waiting for a parser
+        pending.acquire()
+        future = parser_pool.submit(parsers.genie_parse, "IOS", command, show_ver_output)
+        future.add_done_callback(lambda done, ip=ip: print_result(ip, done, pending))
 
         # Set the queue task as complete, thereby removing it from the queue indefinitely
         q.task_done()
@@ -64,19 +92,35 @@ def deviceconnector(i, q):
 
 def main():
 
+    # "hosts" file, or Netbox devices from the inventory cache when INVENTORY_FILTER is set
+    address = [str(device) for device in inventory.hosts()]
+    # SSH sessions shared with other runs when the session broker daemon is up
+    session_pool = shared_pool()
+    pending = threading.BoundedSemaphore(max_pending)
+
+    # Every parser process warms up only the genie parser it is going to use. The processes start
+    # once the SSH threads are running, a fork would copy the locks those threads hold: spawn instead
+    parser_pool = ProcessPoolExecutor(
+        max_workers=num_parsers, mp_context=multiprocessing.get_context("spawn"),
+        initializer=parsers.preload, initargs=([("IOS", command)],)
+    )
+
     # Setting up threads based on number set above
     for i in range(num_threads):
         # Create the thread using 'deviceconnector' as the function, passing in
-        # the thread number and queue object as parameters
+        # the thread number, the queue object and the parser stage as parameters
         thread = threading.Thread(
             target=deviceconnector,
             args=(
                 i,
                 enclosure_queue,
+                session_pool,
+                parser_pool,
+                pending,
             ),
         )
         # Set the thread as a background daemon/job
-        thread.setDaemon(True)
+        thread.daemon = True
         # Start the thread
         thread.start()
 
@@ -86,13 +130,16 @@ def main():
 
     # Wait for all tasks in the queue to be marked as completed (task_done)
     enclosure_queue.join()
+    # And for the outputs still on the parser processes
+    parser_pool.shutdown(wait=True)
     print("*** Script complete")
 
 
 if __name__ == "__main__":
 
+    start_time = datetime.now()
     # Calling the main function
     main()
 
-    endtime = end_time - start_time
+    endtime = datetime.now() - start_time
     print(f"\n{endtime}")
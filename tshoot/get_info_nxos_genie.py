@@ -1,12 +1,18 @@
+import os
+import sys
+# The shared modules (drivers, fleet, net_conn...) are one level up, for python tshoot/<script>.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from netmiko import ConnectHandler
 import net_conn
+import parsers
+import inventory
 from colorama import Fore
 
 class CiscoDevice:
      
     def get_device_info(self):
-        with open("hosts", "r") as f:
-            addresses = f.read().splitlines()
+        # "hosts" file, or Netbox devices from the inventory cache when INVENTORY_FILTER is set
+        addresses = [str(device) for device in inventory.hosts()]
         
 
         for devices in addresses:
@@ -20,11 +26,11 @@ class CiscoDevice:
             # Connect to device
             ssh_connection = ConnectHandler(**device)
             print(Fore.YELLOW + f'Connecting to the device: {devices}' + Fore.RESET)
-            cmd = ssh_connection.find_prompt()
-            cmd = ssh_connection.send_command('show version', use_genie=True)
-            
+            cmd = ssh_connection.send_command('show version')
+            ssh_connection.disconnect()
 
-            show_ver_output = dict(cmd)
+            # Only the genie ShowVersion parser is imported, not the whole genie.libs.parser
+            show_ver_output = dict(parsers.genie_parse("NX-OS", "show version", cmd))
             print(f'Hostname: {show_ver_output["platform"]["hardware"]["device_name"]}')
             print(f'Model: {show_ver_output["platform"]["hardware"]["model"]}')
             print(f'NXOS Version: {show_ver_output["platform"]["software"]["system_version"]}')
@@ -40,4 +46,4 @@ sa = CiscoDevice()
 sa.get_device_info()
     
 
-    
\ No newline at end of file
+    
@@ -1,44 +1,72 @@
-from netmiko import ConnectHandler
+import os
+import sys
+# The shared modules (drivers, fleet, net_conn...) are one level up, for python tshoot/<script>.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from dotenv import load_dotenv
 from datetime import datetime
-import re
+import argparse
 import net_conn
+from async_collect import run, stream
+from mac_table import index_by_vlan
+import drivers
+from sinks import open_sink
+import timing
 load_dotenv()
 
 start_time = datetime.now()
 
 devices = ["br-lp-spac05-leaf1-2", "br-lp-spac04-leaf1-1"]
 
+driver = drivers.get("DellOS9")
+
 # Vlan range used for loop
 vlan = range(2400,2462)
 
-def get_mac_addr_dellos9():
-    for ip in devices:
-        
-        # Netmiko connection
-        iosv = net_conn.netmiko_dellos9(ip)
-        print(f"\n{'#'*79}\nConnecting to the device: {ip}\n")
-        net_connect = ConnectHandler(**iosv)
-        
-        # Loop 
-        for vlans in vlan:
-            
-            print("+"*40)
-            print(f"\nVlan ID {vlans}")
-            show_mac_add = net_connect.send_command(f'show mac-address vlan {vlans}')
-
-            # Regex pattern to find out all mac-addresses
-            mac_add_pattern = "(?:[0-9A-Fa-f]{2}[:-]){5}(?:[0-9A-Fa-f]{2})"
-            mac_add_regex = re.findall(mac_add_pattern,show_mac_add)
-            
-            # Condition after find mac-addresses
-            if mac_add_regex:
-                print(f"{show_mac_add}\n")
-            else:
-                print(f"Without mac-addresses")
-
-        
-        end_time = datetime.now()
-        print("Total time: {}".format(end_time - start_time))
-
-get_mac_addr_dellos9()
\ No newline at end of file
+
+def mac_records(net_connect, ip):
+    # Full mac-address-table once per device, the vlan filter runs locally
+    index = index_by_vlan(driver.mac_table(net_connect, vlan))
+    return [entry for vlans in vlan for entry in index.get(vlans, [])]
+
+
+def print_device(result):
+    print(f"\n{'#'*79}\nDevice: {result.host}\n")
+    if result.status != "ok":
+        print(f"{result.status} {result.error}")
+        return
+
+    index = index_by_vlan(result.data)
+
+    # Loop
+    for vlans in vlan:
+
+        print("+"*40)
+        print(f"\nVlan ID {vlans}")
+        entries = index.get(vlans)
+
+        # Condition after find mac-addresses
+        if entries:
+            for entry in entries:
+                print(f"{entry.vlan:<8}{entry.mac:<20}{entry.type:<10}{entry.port}")
+            print()
+        else:
+            print(f"Without mac-addresses")
+
+
+def get_mac_addr_dellos9(output=None):
+    if output:
+        # Records go straight to the file (.jsonl, .csv, .sqlite or .parquet) as each device finishes
+        with open_sink(output) as sink:
+            written = stream(devices, mac_records, net_conn.netmiko_dellos9, sink, on_failure=print_device)
+        print(f"{written} mac-addresses saved on {output}")
+    else:
+        run(devices, mac_records, net_conn.netmiko_dellos9, print_device)
+
+    end_time = datetime.now()
+    print("Total time: {}".format(end_time - start_time))
+
+
+parser = argparse.ArgumentParser(description="Mac-addresses of the vlan range")
+parser.add_argument("--output", help="file to save the records instead of printing them")
+get_mac_addr_dellos9(parser.parse_args().output)
+timing.profile.save()
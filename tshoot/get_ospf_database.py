@@ -1,63 +1,121 @@
-from netmiko import ConnectHandler
+import os
+import sys
+# The shared modules (drivers, fleet, net_conn...) are one level up, for python tshoot/<script>.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import net_conn
 from dotenv import load_dotenv
 load_dotenv()
 import re
+from functools import partial
+from collections import defaultdict
 from colorama import Fore
 from drawio_network_plot.drawio_network_plot import NetPlot
+from fleet import run_fleet
+import timing
+
+"""
+Breadth-first crawler of the OSPF area
+
+Seed devices give the first router IDs, then every level of the walk connects to all routers
+of the frontier at the same time (fleet executor) and only routers never visited go to the next
+level. The walk stops at MAX_DEPTH or when the connection budget is used. The adjacency graph is
+kept in memory and written to the drawio file after every level.
+"""
 
 # List of devices
 devices = ['S1']
 
-for hosts in devices: 
-        print()
+# How far from the seeds the walk goes and how many devices it can connect to
+MAX_DEPTH = 10
+CONNECTION_BUDGET = 1000
+MAX_WORKERS = 32
+
+DRAWIO_FILE = "ospf_topology.drawio"
+
+# Regex pattern to find only IP Address
+regex = re.compile(r"(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})")
+
+
+def neighbors_of(net_connect, router_id, seeds=()):
+    """
+    Router IDs with neighborship with router_id, or every router ID on the database for a seed
+    """
+    if router_id in seeds:
+        cmd = net_connect.send_command('sh ip ospf database router | in Neighboring')
+    else:
+        cmd = net_connect.send_command(f'sh ip ospf database router {router_id} | in Neighboring')
+    # remove duplicate information into list
+    return list(dict.fromkeys(regex.findall(cmd)))
+
+
+class OspfTopology:
+    def __init__(self):
+        self.adjacency = defaultdict(set)
+        self.plot = NetPlot()
+        self.plotted_nodes = set()
+        self.plotted_links = set()
+
+    def add_links(self, router_id, neighbors):
+        for neighbor in neighbors:
+            if neighbor != router_id:
+                self.adjacency[router_id].add(neighbor)
+                self.adjacency[neighbor].add(router_id)
+
+    def draw(self):
+        """
+        Only nodes and links not written yet go to the drawing
+        """
+        for node in self.adjacency:
+            if node not in self.plotted_nodes:
+                self.plot.addNode(nodeName=node, nodeType="router")
+                self.plotted_nodes.add(node)
+        for node, neighbors in self.adjacency.items():
+            for neighbor in neighbors:
+                link = frozenset((node, neighbor))
+                if link not in self.plotted_links:
+                    self.plot.addLink(sourceNodeID=node, destinationNodeID=neighbor)
+                    self.plotted_links.add(link)
+        self.plot.exportXML(DRAWIO_FILE)
+
+
+def crawl(seeds, max_depth=MAX_DEPTH, budget=CONNECTION_BUDGET):
+    topology = OspfTopology()
+    visited = set()
+    frontier = list(dict.fromkeys(seeds))
+    depth = 0
+
+    while frontier and depth <= max_depth and budget > 0:
+        frontier = frontier[:budget]
+        budget -= len(frontier)
+        visited.update(frontier)
         print("#" * 79)
-        iosv = net_conn.netmiko_nxos(hosts)
-        print(f'Connecting to device {hosts} and find all OSPF Adjacency')
-    
-        net_connect = ConnectHandler(**iosv)
-        print()
-        
-        # Command to find router ID of devices
-        show_routerID = net_connect.send_command('sh ip ospf database router | in Neighboring')
-        
-        regex = "(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})"
-        pattern = re.findall(regex, show_routerID)
-
-        # remove duplicate information into list
-        routerID = list(dict.fromkeys(pattern))
-        print("Router IDs")
-        print(f"{routerID}\n")
-        net_connect.disconnect()
-
-# New loop to connect on neighbors found on device
-print("#" * 79)
-for ip in routerID:
-        list_of_neighborship = []
-
-        iosv = net_conn.netmiko_nxos(ip)
-        print(Fore.YELLOW + f'\nConnecting to the device: {ip}' + Fore.RESET)
-
-        net_connect = ConnectHandler(**iosv)
-        cmd = net_connect.send_command(f'sh ip ospf database router {ip} | in Neighboring')
-        
-        # Regex pattern to find only IP Address
-        regex_cmd = "(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})"
-        pattern_cmd = re.findall(regex_cmd, cmd)
-        
-        # remove duplicate information into list
-        mylist = list(dict.fromkeys(pattern_cmd))
-        print(f"Router ID {ip} has neighborship with:")
-
-        for line in mylist:
-                # regex to search the name of the device before the domain ID ".default" , then removing the word ".default" from the string
-                link = {
-                            'sourceNodeID' : ip,
-                            'destinationNodeID' : line
-                            }
-
-                list_of_neighborship.append(link)
-        
-        # Getting list of links for each device
-        for peering in list_of_neighborship:
-                print(f'{peering}')
+        print(Fore.YELLOW + f"Depth {depth}: connecting to {len(frontier)} devices" + Fore.RESET)
+
+        # Router IDs have no site, the whole frontier is one bucket capped by MAX_WORKERS
+        summary = run_fleet(frontier, partial(neighbors_of, seeds=seeds), net_conn.netmiko_nxos,
+                            max_workers=MAX_WORKERS, per_site=MAX_WORKERS, site_of=lambda router_id: "ospf")
+
+        next_level = []
+        for result in summary.ok:
+            # Seeds are hostnames, they only discover router IDs and are not part of the graph
+            if result.host not in seeds:
+                topology.add_links(result.host, result.data)
+                print(f"Router ID {result.host} has neighborship with: {result.data}")
+            else:
+                print(f"Router IDs from {result.host}: {result.data}")
+            for neighbor in result.data:
+                if neighbor not in visited:
+                    visited.add(neighbor)
+                    next_level.append(neighbor)
+        summary.print_report()
+
+        topology.draw()
+        frontier = next_level
+        depth += 1
+
+    return topology
+
+
+topology = crawl(devices)
+timing.profile.save()
+print(f"\n{len(topology.adjacency)} routers mapped, drawing saved on {DRAWIO_FILE}")
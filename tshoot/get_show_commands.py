@@ -1,32 +1,52 @@
-from netmiko import ConnectHandler
-import net_conn
-import re
+import os
+import sys
+# The shared modules (drivers, fleet, net_conn...) are one level up, for python tshoot/<script>.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import drivers
+import facts
+import parsers
+import output_cache
+from async_collect import run
+import timing
 
 
 with open("ip_list.txt") as f:
     hosts = f.read().splitlines()
 
+driver = drivers.get("IOS")
+
+
 class CiscoDevice:
-        def __init__(self):
-            self.connection = ConnectHandler(ip='S3',
-                                            username=net_conn.user_lab, 
-                                            password=net_conn.pass_lab,
-                                            device_type="cisco_ios")
-    
+        def __init__(self, connection):
+            self.connection = connection
+
         def get_version(self):
-            show_ver_output = self.connection.find_prompt()
-            show_ver_output += self.connection.send_command('show version')
-            version_pattern = re.compile(r'Cisco.+Version.(\d...)')
-            version = re.findall(version_pattern, show_ver_output)
+            show_ver_output = self.connection.send_command('show version')
+            version = facts.parse_show_version(show_ver_output)["version"]
             print(f'IOS Version: {version}')
+            return version
 
         def hostname(self):
-            sh_run_output = self.connection.find_prompt()
-            sh_run_output += self.connection.send_command('show run')
-            hostname_pattern = re.compile(r'hostname (\S+)')
-            hostname = re.findall(hostname_pattern,sh_run_output)
+            # Only the hostname line, not the whole running-config
+            sh_run_output = self.connection.send_command('show running-config | include ^hostname')
+            hostname = parsers.parse("IOS", "show run", sh_run_output)
             print(f'Hostname: {hostname}')
+            return hostname
+
+
+def show_commands(connection, host):
+    sa = CiscoDevice(connection)
+    return sa.hostname(), sa.get_version()
+
+
+def print_result(result):
+    if result.status != "ok":
+        print(f"{result.host}: {result.status} {result.error}")
+
 
-sa = CiscoDevice()
-sa.hostname()
-sa.get_version()
\ No newline at end of file
+parser = argparse.ArgumentParser()
+output_cache.add_arguments(parser)
+# Repeated runs answer from the output cache, the devices are only connected on a miss
+run(hosts, show_commands, driver.params, print_result, pool=output_cache.from_args(parser.parse_args()))
+timing.profile.save()
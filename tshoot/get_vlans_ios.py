@@ -1,52 +1,66 @@
-from netmiko import ConnectHandler
-import net_conn
-import re
+import os
+import sys
+# The shared modules (drivers, fleet, net_conn...) are one level up, for python tshoot/<script>.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import drivers
 from colorama import Fore
-import threading
+from async_collect import run, stream
+from sinks import open_sink
+import argparse
+import inventory
+import output_cache
+import timing
 
-class CiscoDeviceIOS:
-
-    def get_vlans_info(self):
-        with open("hosts", "r") as f:
-            addresses = f.read().splitlines()
 
-        for devices in addresses:
-            device = {
-                "device_type": "cisco_ios",
-                "host": devices,
-                "username": net_conn.user_lab,
-                "password": net_conn.pass_lab,
-                "secret": net_conn.pass_lab,
-            }
+driver = drivers.get("IOS")
 
-            # Connect to device
-            ssh_connection = ConnectHandler(**device)
 
-            show_vlan = ssh_connection.find_prompt()
-            show_ver_output = ssh_connection.send_command("show run")
-            show_vlan = ssh_connection.send_command("show vlan", use_textfsm=True)
-            print(show_vlan)
+class CiscoDeviceIOS:
 
-            hostname_pattern = r"hostname.(\S+)"
-            hostname = re.findall(hostname_pattern, show_ver_output)
+    def vlans_info(self, ssh_connection, host):
+        show_vlan = driver.vlans(ssh_connection)
+        return {
+            "show_vlan": show_vlan,
+            "hostname": driver.hostname(ssh_connection),
+            "vlanid": [vlan.vlan_id for vlan in show_vlan],
+            "vlanid_name": [(vlan.vlan_id, vlan.name) for vlan in show_vlan],
+        }
 
-            """
-            Using FORE to change line color
-            """
-            print(Fore.YELLOW + f"Hostname: {hostname}" + Fore.RESET)
+    def vlan_records(self, ssh_connection, host):
+        return driver.vlans(ssh_connection)
 
-            vlanid_pattern = r"vlan_id':.'(\d+)"
-            vlanid = re.findall(vlanid_pattern, str(show_vlan))
-            print(f"\nVlans ID: {vlanid}")
+    def print_info(self, result):
+        if result.status != "ok":
+            print(Fore.RED + f"{result.host}: {result.status} {result.error}" + Fore.RESET)
+            return
+        info = result.data
+        print(info["show_vlan"])
 
-            vlanfull_pattern = r"vlan_id':.'(\d+).,.'vlan_name':.'(\S+\w)"
-            vlanid_name = re.findall(vlanfull_pattern, str(show_vlan))
-            print(f"Vlan and name: {vlanid_name}\n")
+        """
+        Using FORE to change line color
+        """
+        print(Fore.YELLOW + f"Hostname: {info['hostname']}" + Fore.RESET)
+        print(f"\nVlans ID: {info['vlanid']}")
+        print(f"Vlan and name: {info['vlanid_name']}\n")
 
-            # print(json.dumps(show_vlan, indent = 2))
+    def get_vlans_info(self, output=None, pool=None):
+        if output:
+            # Records go straight to the file (.jsonl, .csv, .sqlite or .parquet) as each device finishes
+            with open_sink(output) as sink:
+                written = stream(inventory.hosts(), self.vlan_records, driver.params, sink, on_failure=self.print_info,
+                                 pool=pool)
+            print(f"{written} records saved on {output}")
+            return
 
-            # show_clock = ssh_connection.send_command('show clock')
-            # print(f"Hour: {show_clock}")
+        # All devices at the same time, each one printed as soon as it answers
+        # (INVENTORY_FILTER on .env picks them from the Netbox inventory instead of "hosts")
+        # "show" outputs still fresh on the output cache do not reach the device (--no-cache to skip it)
+        run(inventory.hosts(), self.vlans_info, driver.params, self.print_info, pool=pool)
 
+parser = argparse.ArgumentParser()
+parser.add_argument("--output", help="file to save the records instead of printing them")
+output_cache.add_arguments(parser)
+args = parser.parse_args()
 sa = CiscoDeviceIOS()
-sa.get_vlans_info()
+sa.get_vlans_info(args.output, output_cache.from_args(args))
+timing.profile.save()
@@ -0,0 +1,234 @@
+from collections import defaultdict
+from colorama import Fore
+from async_collect import run
+from facts import cached_device_type
+from fleet import default_site
+import argparse
+import drivers
+import facts
+import inventory
+import net_conn
+import output_cache
+import timing
+
+"""
+VLAN inventory of the fleet and consistency checks between the devices of a site
+
+"show vlan" is collected from every device at the same time (async_collect, through the driver
+of its platform, so IOS, NX-OS and DellOS9 devices mix on a site) and kept twice:
+
+- an inverted index VLAN -> set of devices, so "which devices of the site do not have VLAN 2431"
+  is one set difference
+- a bitset per device over the 4094 VLANs (a Python int, bit N set when VLAN N exists), so the
+  VLANs missing or extra on a device against its site are one and/not over two ints
+
+The VLANs expected on a site are the ones present on at least QUORUM of its devices, a device
+is missing the expected VLANs it does not have and has extra the ones it has that are not
+expected. Names are compared per VLAN among the devices that have it, a VLAN without name
+(no description on DellOS9) is left out of that comparison.
+
+    python vlan_inventory.py --site br-lp
+    python vlan_inventory.py --site br-lp --vlan 2431
+"""
+
+MAX_VLAN = 4094
+# Defaults present on every switch, left out of the comparisons
+IGNORED_VLANS = frozenset((1, 1002, 1003, 1004, 1005))
+# Share of the devices of a site a VLAN must be on to be expected on all of them
+QUORUM = 0.5
+
+
+def to_mask(vlan_ids):
+    mask = 0
+    for vlan_id in vlan_ids:
+        if 1 <= vlan_id <= MAX_VLAN:
+            mask |= 1 << vlan_id
+    return mask
+
+
+def from_mask(mask):
+    """
+    VLAN ids of the bits set, in order
+    """
+    vlan_ids = []
+    while mask:
+        low = mask & -mask
+        vlan_ids.append(low.bit_length() - 1)
+        mask ^= low
+    return vlan_ids
+
+
+class VlanInventory:
+    def __init__(self, ignored=IGNORED_VLANS):
+        self.ignored = to_mask(ignored)
+        self.sites = defaultdict(set)
+        self.site_of = {}
+        self.masks = {}
+        self.index = defaultdict(set)
+        # {vlan_id: {name: set of devices}}
+        self.names = defaultdict(lambda: defaultdict(set))
+
+    def __len__(self):
+        return len(self.masks)
+
+    def add(self, host, site, vlans):
+        """
+        parsers.Vlan records of a device
+        """
+        self.remove(host)
+        mask = to_mask(vlan.vlan_id for vlan in vlans) & ~self.ignored
+        self.sites[site].add(host)
+        self.site_of[host] = site
+        self.masks[host] = mask
+        for vlan in vlans:
+            if mask >> vlan.vlan_id & 1:
+                self.index[vlan.vlan_id].add(host)
+                if vlan.name:
+                    self.names[vlan.vlan_id][vlan.name].add(host)
+
+    def remove(self, host):
+        mask = self.masks.pop(host, None)
+        if mask is None:
+            return
+        self.sites[self.site_of.pop(host)].discard(host)
+        for vlan_id in from_mask(mask):
+            self.index[vlan_id].discard(host)
+            for hosts in self.names[vlan_id].values():
+                hosts.discard(host)
+
+    def devices(self, site=None):
+        return set(self.masks) if site is None else set(self.sites.get(site, ()))
+
+    def devices_with(self, vlan_id, site=None):
+        hosts = self.index.get(vlan_id, set())
+        return set(hosts) if site is None else hosts & self.sites.get(site, set())
+
+    def devices_missing(self, vlan_id, site=None):
+        """
+        Devices of the site without the VLAN, whether their peers have it or not
+        """
+        return self.devices(site) - self.index.get(vlan_id, set())
+
+    def expected(self, site, quorum=QUORUM):
+        """
+        Bitset of the VLANs present on at least quorum of the devices of the site
+        """
+        hosts = self.sites.get(site, set())
+        if not hosts:
+            return 0
+        union = 0
+        for host in hosts:
+            union |= self.masks[host]
+        needed = quorum * len(hosts)
+        return to_mask(vlan_id for vlan_id in from_mask(union) if len(self.index[vlan_id] & hosts) >= needed)
+
+    def missing(self, site, quorum=QUORUM):
+        """
+        {device: [VLANs expected on the site it does not have]}, devices missing nothing left out
+        """
+        expected = self.expected(site, quorum)
+        return self._per_device(site, lambda mask: expected & ~mask)
+
+    def extra(self, site, quorum=QUORUM):
+        """
+        {device: [VLANs it has that are not expected on the site]}
+        """
+        expected = self.expected(site, quorum)
+        return self._per_device(site, lambda mask: mask & ~expected)
+
+    def _per_device(self, site, difference):
+        results = {}
+        for host in sorted(self.sites.get(site, ())):
+            mask = difference(self.masks[host])
+            if mask:
+                results[host] = from_mask(mask)
+        return results
+
+    def name_mismatches(self, site=None):
+        """
+        {vlan_id: {name: sorted devices}} of the VLANs with more than one name on the site
+        """
+        hosts = self.devices(site)
+        results = {}
+        for vlan_id in sorted(self.names):
+            names = {name: members & hosts for name, members in self.names[vlan_id].items()}
+            names = {name: sorted(members) for name, members in names.items() if members}
+            if len(names) > 1:
+                results[vlan_id] = names
+        return results
+
+
+def vlans_task(net_connect, host):
+    # Mixed fleets: the platform (and so the driver) comes from the facts cache or "show version"
+    return drivers.for_device(net_connect, host).vlans(net_connect)
+
+
+def collect(devices, pool=None, site_of=default_site, on_failure=None):
+    """
+    VlanInventory of the devices, collected all at the same time
+    """
+    vlan_inventory = VlanInventory()
+    facts.load_netbox(devices)
+
+    def record(result):
+        if result.status == "ok":
+            vlan_inventory.add(result.host, result.site, result.data)
+        elif on_failure is not None:
+            on_failure(result)
+
+    run(devices, vlans_task, cached_device_type(net_conn.netmiko_lab), record, pool=pool, site_of=site_of)
+    return vlan_inventory
+
+
+def print_failure(result):
+    print(Fore.RED + f"{result.host}: {result.status} {result.error}" + Fore.RESET)
+
+
+def print_report(vlan_inventory, quorum=QUORUM):
+    for site in sorted(vlan_inventory.sites):
+        hosts = vlan_inventory.devices(site)
+        if not hosts:
+            continue
+        expected = vlan_inventory.expected(site, quorum)
+        print(Fore.YELLOW + f"\nSite {site}: {len(hosts)} devices, {bin(expected).count('1')} VLANs expected" + Fore.RESET)
+        for host, vlan_ids in vlan_inventory.missing(site, quorum).items():
+            print(Fore.RED + f"{host:<30}missing {vlan_ids}" + Fore.RESET)
+        for host, vlan_ids in vlan_inventory.extra(site, quorum).items():
+            print(f"{host:<30}extra {vlan_ids}")
+        for vlan_id, names in vlan_inventory.name_mismatches(site).items():
+            print(Fore.MAGENTA + f"VLAN {vlan_id} names: {names}" + Fore.RESET)
+
+
+def print_vlan(vlan_inventory, vlan_id):
+    for site in sorted(vlan_inventory.sites):
+        having = vlan_inventory.devices_with(vlan_id, site)
+        if not having:
+            continue
+        print(Fore.YELLOW + f"\nSite {site}: VLAN {vlan_id} on {len(having)} devices" + Fore.RESET)
+        for host in sorted(vlan_inventory.devices_missing(vlan_id, site)):
+            print(Fore.RED + f"{host:<30}missing VLAN {vlan_id}" + Fore.RESET)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VLAN consistency between the devices of each site")
+    parser.add_argument("--vlan", type=int, help="Only the devices missing this VLAN that their site peers have")
+    parser.add_argument("--quorum", type=float, default=QUORUM,
+                        help="Share of the devices of a site a VLAN must be on to be expected (default 0.5)")
+    inventory.add_arguments(parser)
+    output_cache.add_arguments(parser)
+    args = parser.parse_args()
+
+    # Netbox devices from the inventory cache with --platform/--site/--model/--role, "hosts" file without
+    devices = inventory.from_args(args)
+    vlan_inventory = collect(devices, pool=output_cache.from_args(args), on_failure=print_failure)
+    facts.cache.save()
+    timing.profile.save()
+
+    if args.vlan is not None:
+        print_vlan(vlan_inventory, args.vlan)
+    else:
+        print_report(vlan_inventory, args.quorum)
+
+
+if __name__ == "__main__":
+    main()